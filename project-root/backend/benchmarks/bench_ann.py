@@ -0,0 +1,195 @@
+"""
+Compares index configurations for a large task: Chroma's HNSW index at
+several M / ef_construction / ef_search settings, and the int8 quantized
+index (quantized_index.py) at several re-ranking depths. For each it
+reports build time, size on disk, the memory a process gains by opening
+the index and answering a query, query latency, and recall@k against an
+exact search.
+
+Vectors are synthetic: unit vectors in clusters around random centers, the
+dimension of all-MiniLM-L6-v2, so no model or PDF parsing is needed and
+ground truth is exact. Each build and each query run happens in a fresh
+process so memory is measured in isolation.
+
+    python -m benchmarks.bench_ann --vectors 50000 --queries 200 --k 10
+    python -m benchmarks.bench_ann --hnsw 16,100,10 16,100,100 32,200,100 --rerank 1 4 --output ann.json
+"""
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+from pathlib import Path
+from typing import Any, Dict, List
+import numpy as np
+
+DIMENSION = 384
+COLLECTION = "bench_ann"
+
+
+def make_vectors(count: int, clusters: int, spread: float, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, DIMENSION)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, count)] + spread * rng.standard_normal((count, DIMENSION)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def exact_neighbors(vectors: np.ndarray, queries: np.ndarray, k: int) -> List[set]:
+    scores = queries @ vectors.T
+    return [set(np.argsort(-row)[:k].tolist()) for row in scores]
+
+
+def rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def dir_mb(path: Path) -> float:
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file()) / (1024 * 1024)
+
+
+def build(spec: Dict[str, Any]) -> Dict[str, Any]:
+    vectors = np.load(spec["vectors"])
+    ids = [str(i) for i in range(len(vectors))]
+    documents = [f"chunk {i}" for i in ids]
+    metadatas = [{"pdf_name": f"doc_{int(i) // 100}.pdf", "page_number": 1} for i in ids]
+    index_dir = Path(spec["index_dir"])
+    start = time.perf_counter()
+    if spec["kind"] == "hnsw":
+        from chromadb import PersistentClient
+        collection = PersistentClient(path=str(index_dir)).get_or_create_collection(
+            COLLECTION,
+            configuration={"hnsw": {"space": "cosine", "max_neighbors": spec["m"], "ef_construction": spec["ef_construction"]}},
+        )
+        add = collection.add
+    else:
+        from quantized_index import QuantizedIndex
+        add = QuantizedIndex(index_dir / "vectors_int8.sqlite3", "cosine").add
+    for offset in range(0, len(vectors), 1000):
+        end = offset + 1000
+        add(ids=ids[offset:end], embeddings=vectors[offset:end], documents=documents[offset:end], metadatas=metadatas[offset:end])
+    return {"build_seconds": round(time.perf_counter() - start, 2)}
+
+
+def query(spec: Dict[str, Any]) -> Dict[str, Any]:
+    queries = np.load(spec["queries"])
+    truth = [set(row) for row in json.loads(Path(spec["truth"]).read_text())]
+    k = spec["k"]
+    index_dir = Path(spec["index_dir"])
+    baseline = rss_mb()
+    if spec["kind"] == "hnsw":
+        from chromadb import PersistentClient
+        collection = PersistentClient(path=str(index_dir)).get_collection(COLLECTION)
+        collection.modify(configuration={"hnsw": {"ef_search": spec["ef_search"]}})
+
+        def search(vector):
+            return [int(i) for i in collection.query(query_embeddings=[vector.tolist()], n_results=k, include=[])["ids"][0]]
+    else:
+        from quantized_index import QuantizedIndex
+        index = QuantizedIndex(index_dir / "vectors_int8.sqlite3", "cosine")
+        loaded = index.load()
+
+        def search(vector):
+            return [int(hit["id"]) for hit in index.search([vector], k, k * spec["rerank_factor"], loaded)[0]]
+
+    # The first query loads the index; its memory is counted, its latency is not.
+    search(queries[0])
+    index_mb = rss_mb() - baseline
+    latencies = []
+    found = 0
+    for vector, expected in zip(queries, truth):
+        start = time.perf_counter()
+        result = search(vector)
+        latencies.append(time.perf_counter() - start)
+        found += len(expected.intersection(result))
+    latencies.sort()
+    return {
+        "index_rss_mb": round(index_mb, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000, 2),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 2),
+        f"recall@{k}": round(found / (len(truth) * k), 4),
+    }
+
+
+def in_subprocess(step: str, spec: Dict[str, Any]) -> Dict[str, Any]:
+    completed = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_ann", "--worker", step, json.dumps(spec)],
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--spread", type=float, default=0.6, help="Noise around cluster centers; larger is harder.")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--hnsw", nargs="*", default=["16,100,10", "16,100,100", "32,200,100"],
+                        help="HNSW configurations as M,ef_construction,ef_search.")
+    parser.add_argument("--rerank", type=int, nargs="*", default=[1, 4], help="int8 re-ranking factors.")
+    parser.add_argument("--output", type=Path, default=None, help="Write the results to this JSON file.")
+    parser.add_argument("--worker", nargs=2, metavar=("STEP", "SPEC"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        step, spec = args.worker
+        print(json.dumps((build if step == "build" else query)(json.loads(spec))))
+        return
+
+    work_dir = Path(tempfile.mkdtemp(prefix="bench_ann_"))
+    try:
+        vectors = make_vectors(args.vectors, args.clusters, args.spread, args.seed)
+        # Queries are perturbed copies of random vectors, like a selection close to a passage.
+        rng = np.random.default_rng(args.seed + 1)
+        queries = vectors[rng.integers(0, len(vectors), args.queries)] + 0.3 * rng.standard_normal((args.queries, DIMENSION)).astype(np.float32) / np.sqrt(DIMENSION)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+        np.save(work_dir / "vectors.npy", vectors)
+        np.save(work_dir / "queries.npy", queries)
+        (work_dir / "truth.json").write_text(json.dumps([sorted(s) for s in exact_neighbors(vectors, queries, args.k)]))
+        common = {"vectors": str(work_dir / "vectors.npy"), "queries": str(work_dir / "queries.npy"),
+                  "truth": str(work_dir / "truth.json"), "k": args.k}
+        float32_mb = vectors.nbytes / (1024 * 1024)
+        print(f"{args.vectors} vectors of dimension {DIMENSION} ({float32_mb:.1f} MB as float32), {args.queries} queries")
+
+        runs = []
+        built = {}
+        for config in args.hnsw:
+            m, ef_construction, ef_search = (int(v) for v in config.split(","))
+            index_dir = work_dir / f"hnsw_{m}_{ef_construction}"
+            spec = {**common, "kind": "hnsw", "index_dir": str(index_dir), "m": m, "ef_construction": ef_construction}
+            if (m, ef_construction) not in built:
+                built[(m, ef_construction)] = {**in_subprocess("build", spec), "disk_mb": round(dir_mb(index_dir), 1)}
+            runs.append({"index": f"hnsw M={m} ef_construction={ef_construction} ef_search={ef_search}",
+                         **built[(m, ef_construction)], **in_subprocess("query", {**spec, "ef_search": ef_search})})
+        if args.rerank:
+            index_dir = work_dir / "int8"
+            spec = {**common, "kind": "int8", "index_dir": str(index_dir)}
+            int8_build = {**in_subprocess("build", spec), "disk_mb": round(dir_mb(index_dir), 1)}
+            for factor in args.rerank:
+                runs.append({"index": f"int8 rerank_factor={factor}", **int8_build,
+                             **in_subprocess("query", {**spec, "rerank_factor": factor})})
+
+        columns = ["build_seconds", "disk_mb", "index_rss_mb", "p50_ms", "p95_ms", f"recall@{args.k}"]
+        print(f"{'index':<50}" + "".join(f"{c:>14}" for c in columns))
+        for run in runs:
+            print(f"{run['index']:<50}" + "".join(f"{run[c]:>14}" for c in columns))
+        if args.output:
+            args.output.write_text(json.dumps({"args": {k: v for k, v in vars(args).items() if k not in ("output", "worker")},
+                                               "results": runs}, indent=2, default=str))
+            print(f"Results written to {args.output}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Compares query throughput of one-at-a-time get_recommendations calls with
+get_recommendations_batch at several batch sizes. Result caches are disabled
+so every query pays for its encode and vector search.
+
+    python -m benchmarks.bench_batch_query --pdfs 50 --pages 10 --queries 256
+"""
+import time
+import random
+import argparse
+import tempfile
+from pathlib import Path
+import model
+from embedding_cache import EmbeddingCache
+from benchmarks.corpus import make_corpus, make_sentence
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdfs", type=int, default=50)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=256)
+    parser.add_argument("--n-results", type=int, default=5)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[4, 16, 64])
+    args = parser.parse_args()
+
+    if model.get_embedding_model() is None:
+        raise SystemExit("Embedding model not loaded.")
+
+    model.QUERY_EMBEDDINGS.max_entries = 0
+    model.SEARCH_RESULTS.max_entries = 0
+
+    # Keep benchmark tasks out of the server's global index and embedding cache.
+    model.GLOBAL_INDEX_PATH = Path(tempfile.mkdtemp(prefix="bench_global_"))
+    model.EMBEDDING_CACHE = EmbeddingCache(Path(tempfile.mkdtemp(prefix="bench_cache_")), model.EMBEDDING_CACHE.max_bytes)
+    corpus_dir = Path(tempfile.gettempdir()) / f"bench_corpus_{args.pdfs}x{args.pages}"
+    make_corpus(corpus_dir, args.pdfs, args.pages)
+    task_path = Path(tempfile.mkdtemp(prefix="bench_task_"))
+    task_name = "bench_batch_query"
+    model.embed_documents(task_name, corpus_dir, task_path)
+
+    rng = random.Random(1)
+    queries = [make_sentence(rng) for _ in range(args.queries)]
+
+    start = time.perf_counter()
+    for query in queries:
+        model.get_recommendations(task_name, query, task_path, args.n_results)
+    single_elapsed = time.perf_counter() - start
+
+    print(f"{'mode':>12} {'queries/s':>10} {'speedup':>8}")
+    print(f"{'single':>12} {len(queries) / single_elapsed:>10.1f} {1.0:>7.2f}x")
+    for batch_size in args.batch_sizes:
+        start = time.perf_counter()
+        for i in range(0, len(queries), batch_size):
+            model.get_recommendations_batch(task_name, queries[i:i + batch_size], task_path, args.n_results)
+        elapsed = time.perf_counter() - start
+        print(f"{f'batch={batch_size}':>12} {len(queries) / elapsed:>10.1f} {single_elapsed / elapsed:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
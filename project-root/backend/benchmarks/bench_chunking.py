@@ -0,0 +1,81 @@
+"""
+Compares the chunkers in chunking.CHUNKERS on a synthetic corpus of headed,
+multi-sentence sections: chunk count, parse and embed time, and retrieval
+quality. Queries are word spans taken from random sentences of the corpus;
+a hit means a top-k chunk comes from the page the sentence is on.
+
+    python -m benchmarks.bench_chunking --pdfs 20 --pages 10 --queries 200
+"""
+import time
+import random
+import argparse
+import tempfile
+from pathlib import Path
+import numpy as np
+import model
+import chunking
+from benchmarks.corpus import make_corpus
+
+
+def make_queries(pdf_paths, count, rng):
+    """Returns (query, pdf_name, page_number) from spans of corpus sentences."""
+    sentences = []
+    for pdf_path in pdf_paths:
+        for chunk in chunking.chunk_sentences(pdf_path):
+            words = chunk["text"].split()
+            if len(words) >= 8:
+                sentences.append((words, chunk["pdf_name"], chunk["page_number"]))
+    queries = []
+    for words, pdf_name, page_number in rng.sample(sentences, min(count, len(sentences))):
+        length = max(6, int(len(words) * 0.6))
+        start = rng.randint(0, len(words) - length)
+        queries.append((" ".join(words[start:start + length]), pdf_name, page_number))
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdfs", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    encoder = model.get_embedding_model()
+    if encoder is None:
+        raise SystemExit("Embedding model not loaded.")
+
+    corpus_dir = Path(tempfile.gettempdir()) / f"bench_structured_corpus_{args.pdfs}x{args.pages}"
+    pdf_paths = make_corpus(corpus_dir, args.pdfs, args.pages, structured=True)
+    queries = make_queries(pdf_paths, args.queries, random.Random(1))
+    query_vectors = np.asarray(encoder.encode([q for q, _, _ in queries], batch_size=model.EMBED_BATCH_SIZE))
+    query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True)
+
+    print(f"{'chunker':>12} {'chunks':>8} {'avg tokens':>10} {'parse s':>8} {'embed s':>8} {f'hit@{args.k}':>7} {'mrr':>6}")
+    for name, chunker in chunking.CHUNKERS.items():
+        start = time.perf_counter()
+        chunks = [chunk for pdf_path in pdf_paths for chunk in chunker(pdf_path)]
+        parse_elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        vectors = np.asarray(encoder.encode([c["text"] for c in chunks], batch_size=model.EMBED_BATCH_SIZE))
+        embed_elapsed = time.perf_counter() - start
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+        locations = [(c["pdf_name"], c["page_number"]) for c in chunks]
+        top = np.argsort(-(query_vectors @ vectors.T), axis=1)[:, :args.k]
+        hits = 0
+        reciprocal_ranks = 0.0
+        for (_, pdf_name, page_number), row in zip(queries, top):
+            ranks = [rank for rank, i in enumerate(row) if locations[i] == (pdf_name, page_number)]
+            if ranks:
+                hits += 1
+                reciprocal_ranks += 1 / (ranks[0] + 1)
+
+        avg_tokens = sum(chunking.count_tokens(c["text"]) for c in chunks) / max(len(chunks), 1)
+        print(f"{name:>12} {len(chunks):>8} {avg_tokens:>10.1f} {parse_elapsed:>8.2f} {embed_elapsed:>8.2f} "
+              f"{hits / len(queries):>7.3f} {reciprocal_ranks / len(queries):>6.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,388 @@
+"""
+End-to-end benchmark suite. Generates a synthetic PDF corpus, then measures
+ingestion with embed_documents, queries with get_recommendations, and the
+main HTTP endpoints of an in-process server whose LLM and TTS are local
+stubs (benchmarks/stub_servers.py). Each scenario reports throughput,
+p50/p95/p99 latency and the peak RSS of this process and its parse workers.
+Results are written as JSON, and two result files can be compared.
+
+    python -m benchmarks.bench_e2e --pdfs 20 --pages 10 --requests 100 --output before.json
+    python -m benchmarks.bench_e2e --pdfs 20 --pages 10 --requests 100 --output after.json
+    python -m benchmarks.bench_e2e --compare before.json after.json --threshold 0.1
+
+Query and LLM caches are disabled unless --keep-caches is given, so each
+request does the full work. The embedding model is the real one.
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+import httpx
+from benchmarks.corpus import make_corpus, make_sentence
+from benchmarks.stub_servers import make_llm_handler, make_tts_handler, start_server
+
+# Settings that change performance, recorded with each run.
+RECORDED_SETTINGS = (
+    "EMBEDDING_BACKEND", "EMBEDDING_THREADS", "EMBED_BATCH_SIZE", "EMBED_TOKEN_BUDGET", "CHUNKER",
+    "CHUNK_MAX_TOKENS", "PARSE_WORKERS", "SEARCH_MODE", "INGEST_WORKERS", "LLM_CONCURRENCY",
+    "TTS_CONCURRENCY",
+)
+
+
+def _process_tree_rss_kb(pid: int) -> int:
+    """Resident memory of a process and its descendants, from /proc (Linux only)."""
+    total = 0
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    total += int(line.split()[1])
+        for task_dir in os.scandir(f"/proc/{pid}/task"):
+            with open(os.path.join(task_dir.path, "children")) as f:
+                total += sum(_process_tree_rss_kb(int(child)) for child in f.read().split())
+    except (OSError, ValueError):
+        pass
+    return total
+
+
+class PeakRss:
+    """Samples the RSS of this process and its children while in use."""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak_kb = 0
+        self._stop = threading.Event()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak_kb = max(self.peak_kb, _process_tree_rss_kb(os.getpid()))
+
+    def __enter__(self) -> "PeakRss":
+        self.peak_kb = _process_tree_rss_kb(os.getpid())
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_kb = max(self.peak_kb, _process_tree_rss_kb(os.getpid()))
+        if not self.peak_kb:
+            # No /proc: fall back to the high-water mark of this process alone.
+            import resource
+            self.peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def percentile(ordered: List[float], p: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def summarize(latencies: List[float], seconds: float, errors: int, rss: PeakRss, **extra) -> Dict[str, Any]:
+    ordered = sorted(latencies)
+    result: Dict[str, Any] = {"count": len(latencies), "errors": errors, "seconds": round(seconds, 3)}
+    if ordered:
+        result.update(
+            throughput_per_s=round(len(ordered) / seconds, 3),
+            p50_ms=round(percentile(ordered, 50) * 1000, 2),
+            p95_ms=round(percentile(ordered, 95) * 1000, 2),
+            p99_ms=round(percentile(ordered, 99) * 1000, 2),
+            mean_ms=round(sum(ordered) / len(ordered) * 1000, 2),
+        )
+    result["peak_rss_mb"] = round(rss.peak_kb / 1024, 1)
+    result.update(extra)
+    return result
+
+
+def print_result(name: str, result: Dict[str, Any]):
+    fields = " ".join(f"{k}={v}" for k, v in result.items())
+    print(f"{name:<32} {fields}", flush=True)
+
+
+def bench_ingest(model, corpus_dir: Path, work_dir: Path, task_name: str, pages: int) -> Dict[str, Any]:
+    task_path = work_dir / task_name
+    task_path.mkdir(parents=True)
+    with PeakRss() as rss:
+        start = time.perf_counter()
+        manifest = model.embed_documents(task_name, corpus_dir, task_path)
+        seconds = time.perf_counter() - start
+    pdfs = len(manifest)
+    chunks = sum(entry["chunks"] for entry in manifest.values())
+    return summarize(
+        [], seconds, 0, rss,
+        pdfs=pdfs, chunks=chunks,
+        pdfs_per_s=round(pdfs / seconds, 3),
+        pages_per_s=round(pdfs * pages / seconds, 3),
+        chunks_per_s=round(chunks / seconds, 3),
+    )
+
+
+def bench_queries(model, task_name: str, task_path: Path, queries: List[str]) -> Dict[str, Any]:
+    latencies = []
+    with PeakRss() as rss:
+        start = time.perf_counter()
+        for query in queries:
+            query_start = time.perf_counter()
+            model.get_recommendations(task_name, query, task_path, 5)
+            latencies.append(time.perf_counter() - query_start)
+        seconds = time.perf_counter() - start
+    return summarize(latencies, seconds, 0, rss)
+
+
+async def drive(client: httpx.AsyncClient, make_request: Callable[[int], Any], count: int, concurrency: int) -> Dict[str, Any]:
+    """Sends `count` requests, at most `concurrency` at a time, and summarizes their latency."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors = 0
+
+    async def one(i: int):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await make_request(i)
+                ok = response.status_code < 400
+                await response.aread()
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    with PeakRss() as rss:
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(count)))
+        seconds = time.perf_counter() - start
+    return summarize(latencies, seconds, errors, rss, concurrency=concurrency)
+
+
+async def bench_http(base_url: str, pdf_paths: List[Path], queries: List[str], args) -> Dict[str, Dict[str, Any]]:
+    results: Dict[str, Dict[str, Any]] = {}
+    task_name = "bench_http"
+    async with httpx.AsyncClient(base_url=base_url, timeout=300) as client:
+        with PeakRss() as rss:
+            start = time.perf_counter()
+            files = [("bulk_files", (p.name, open(p, "rb"), "application/pdf")) for p in pdf_paths]
+            files.append(("fresh_file", (pdf_paths[0].name, open(pdf_paths[0], "rb"), "application/pdf")))
+            response = await client.post(f"/upload_task/{task_name}", files=files)
+            for _, (_, f, _) in files:
+                f.close()
+            response.raise_for_status()
+            while (await client.get(f"/tasks/{task_name}/progress")).json()["status"] == "processing":
+                await asyncio.sleep(0.05)
+            seconds = time.perf_counter() - start
+        status = (await client.get(f"/tasks/{task_name}/progress")).json()["status"]
+        results["http.upload_task"] = summarize(
+            [], seconds, int(status != "ready"), rss, pdfs=len(pdf_paths), pdfs_per_s=round(len(pdf_paths) / seconds, 3)
+        )
+        print_result("http.upload_task", results["http.upload_task"])
+
+        def query(i: int) -> str:
+            return queries[i % len(queries)]
+
+        sample = (await client.post("/get_recommendations", json={"task_name": task_name, "query_text": query(0)})).json()
+        recommendations = sample.get("recommendations", [])
+        script = " ".join(make_sentence(random.Random(i)) for i in range(args.script_sentences))
+
+        scenarios = {
+            "http.get_recommendations": lambda i: client.post(
+                "/get_recommendations", json={"task_name": task_name, "query_text": query(i)}),
+            "http.get_recommendations_batch": lambda i: client.post(
+                "/get_recommendations/batch",
+                json={"task_name": task_name, "query_texts": [query(i * 8 + j) for j in range(8)]}),
+            "http.search": lambda i: client.post("/search", json={"query_text": query(i)}),
+            "http.get_insights": lambda i: client.post(
+                "/get_insights",
+                json={"task_name": task_name, "query_text": query(i), "recommendations": recommendations}),
+            "http.generate_podcast_audio": lambda i: client.post(
+                "/generate_podcast_audio", json={"script": f"{i}. {script}"}),
+        }
+        for name, make_request in scenarios.items():
+            count = max(1, args.requests // 4) if name == "http.generate_podcast_audio" else args.requests
+            results[name] = await drive(client, make_request, count, args.concurrency)
+            print_result(name, results[name])
+    return results
+
+
+def start_app(port: int):
+    import uvicorn
+    import main
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, name="bench-server", daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def free_port() -> int:
+    import socket
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    work_dir = Path(tempfile.mkdtemp(prefix="bench_e2e_"))
+    llm = start_server(make_llm_handler(args.llm_latency))
+    tts = start_server(make_tts_handler(args.tts_latency))
+    # The app reads its configuration at import time, so everything it
+    # writes goes to the scratch directory and external calls to the stubs.
+    os.environ.update(
+        TASK_DIR=str(work_dir / "tasks"),
+        TASK_CATALOG_PATH=str(work_dir / "task_catalog.sqlite3"),
+        EMBEDDING_CACHE_DIR=str(work_dir / "embedding_cache"),
+        GLOBAL_INDEX_DIR=str(work_dir / "global_index"),
+        PAGE_CACHE_DIR=str(work_dir / "page_cache"),
+        TTS_CACHE_DIR=str(work_dir / "tts_cache"),
+        LLM_PROVIDER="openai",
+        LLM_BASE_URL=f"http://127.0.0.1:{llm.server_address[1]}/v1",
+        TTS_PROVIDER="azure",
+        AZURE_TTS_KEY="stub",
+        AZURE_TTS_ENDPOINT=f"http://127.0.0.1:{tts.server_address[1]}/sts/v1.0/issueToken",
+        AZURE_TTS_SPEECH_ENDPOINT=f"http://127.0.0.1:{tts.server_address[1]}/cognitiveservices/v1",
+    )
+    if not args.keep_caches:
+        os.environ.update(TTS_CACHE_MAX_MB="0")
+    frontend_dir = Path(os.getenv("FRONTEND_BUILD_DIR", Path(__file__).resolve().parents[2] / "frontend" / "dist"))
+    if not frontend_dir.is_dir():
+        # The server mounts the frontend build, which benchmarks do not need.
+        (work_dir / "frontend").mkdir()
+        (work_dir / "frontend" / "index.html").write_text("")
+        os.environ["FRONTEND_BUILD_DIR"] = str(work_dir / "frontend")
+
+    import model
+    if model.get_embedding_model() is None:
+        raise SystemExit("Embedding model not loaded.")
+    if not args.keep_caches:
+        model.QUERY_EMBEDDINGS.max_entries = 0
+        model.SEARCH_RESULTS.max_entries = 0
+        model.LLM_RESPONSES.max_entries = 0
+
+    corpus_dir = work_dir / "corpus"
+    start = time.perf_counter()
+    pdf_paths = make_corpus(corpus_dir, args.pdfs, args.pages, seed=args.seed, structured=args.structured)
+    print(f"Generated {args.pdfs} PDFs of {args.pages} pages in {time.perf_counter() - start:.1f}s", flush=True)
+    rng = random.Random(args.seed)
+    queries = [make_sentence(rng) for _ in range(max(args.requests, 1) * 8)]
+
+    results: Dict[str, Dict[str, Any]] = {}
+    results["ingest.embed_documents"] = bench_ingest(model, corpus_dir, work_dir / "direct", "bench_cold", args.pages)
+    print_result("ingest.embed_documents", results["ingest.embed_documents"])
+    # The same PDFs again, now served from the embedding cache.
+    results["ingest.embed_documents_cached"] = bench_ingest(model, corpus_dir, work_dir / "direct", "bench_warm", args.pages)
+    print_result("ingest.embed_documents_cached", results["ingest.embed_documents_cached"])
+    results["query.get_recommendations"] = bench_queries(
+        model, "bench_cold", work_dir / "direct" / "bench_cold", queries[:args.requests]
+    )
+    print_result("query.get_recommendations", results["query.get_recommendations"])
+
+    server = start_app(free_port())
+    try:
+        results.update(asyncio.run(bench_http(f"http://127.0.0.1:{server.config.port}", pdf_paths, queries, args)))
+    finally:
+        server.should_exit = True
+        llm.shutdown()
+        tts.shutdown()
+        if not args.keep_work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "model": model.EMBEDDING_SIGNATURE,
+            "args": {k: v for k, v in vars(args).items() if k not in ("compare", "output", "threshold", "fail_on_regression")},
+            "settings": {name: os.getenv(name) for name in RECORDED_SETTINGS if os.getenv(name) is not None},
+        },
+        "results": results,
+    }
+
+
+# Metrics compared between runs, and whether a larger value is better.
+COMPARED_METRICS = {
+    "throughput_per_s": True, "pdfs_per_s": True, "chunks_per_s": True,
+    "p50_ms": False, "p95_ms": False, "p99_ms": False, "seconds": False, "peak_rss_mb": False,
+}
+
+
+def compare(before_path: Path, after_path: Path, threshold: float) -> int:
+    """Prints the change of every metric; returns the number of regressions beyond `threshold`."""
+    before = json.loads(before_path.read_text())
+    after = json.loads(after_path.read_text())
+    print(f"before: {before['meta'].get('commit')} {before['meta'].get('created_at')}")
+    print(f"after:  {after['meta'].get('commit')} {after['meta'].get('created_at')}")
+    if before["meta"].get("args") != after["meta"].get("args"):
+        print("Warning: the runs used different arguments.")
+    regressions = 0
+    print(f"{'scenario':<32} {'metric':<17} {'before':>10} {'after':>10} {'change':>8}")
+    for scenario, after_result in after["results"].items():
+        before_result = before["results"].get(scenario)
+        if before_result is None:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            old, new = before_result.get(metric), after_result.get(metric)
+            if old is None or new is None or old == 0:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            flag = ""
+            if worse > threshold:
+                flag = "  REGRESSION"
+                regressions += 1
+            print(f"{scenario:<32} {metric:<17} {old:>10} {new:>10} {change:>+7.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdfs", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--structured", action="store_true", help="Generate PDFs with headings and paragraphs.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--requests", type=int, default=100, help="Requests per query scenario.")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--tts-latency", type=float, default=0.05)
+    parser.add_argument("--script-sentences", type=int, default=60, help="Length of the podcast script sent to TTS.")
+    parser.add_argument("--keep-caches", action="store_true")
+    parser.add_argument("--keep-work-dir", action="store_true")
+    parser.add_argument("--output", type=Path, default=None, help="Write the results to this JSON file.")
+    parser.add_argument("--compare", type=Path, nargs=2, metavar=("BEFORE", "AFTER"))
+    parser.add_argument("--threshold", type=float, default=0.1, help="Relative change counted as a regression.")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    if args.compare:
+        regressions = compare(*args.compare, args.threshold)
+        sys.exit(1 if regressions and args.fail_on_regression else 0)
+
+    report = run(args)
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Compares embedding backends on ingestion of a synthetic corpus: end-to-end
+embed_documents throughput, encoder throughput with fixed-size batches
+versus embedding_backend.encode's length-sorted token-budget batches, and
+agreement with the first backend listed (the reference): the largest
+cosine distance between their chunk vectors, checked against
+embedding_backend.TOLERANCES, and recall@k of the reference's nearest
+chunks for sample queries.
+
+    python -m benchmarks.bench_embedding --backends torch onnx onnx-int8 --threads 4
+"""
+import time
+import random
+import argparse
+import tempfile
+from pathlib import Path
+import numpy as np
+import model
+import chunking
+import embedding_backend
+from embedding_cache import EmbeddingCache
+from benchmarks.corpus import make_corpus, make_sentence
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx", "onnx-int8"])
+    parser.add_argument("--threads", type=int, default=embedding_backend.EMBEDDING_THREADS)
+    parser.add_argument("--pdfs", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=32, help="fixed batch size to compare against")
+    args = parser.parse_args()
+
+    corpus_dir = Path(tempfile.gettempdir()) / f"bench_structured_corpus_{args.pdfs}x{args.pages}"
+    pdf_paths = make_corpus(corpus_dir, args.pdfs, args.pages, structured=True)
+    texts = [chunk["text"] for pdf_path in pdf_paths for chunk in chunking.chunk_text(pdf_path)]
+    rng = random.Random(1)
+    queries = [make_sentence(rng) for _ in range(args.queries)]
+    print(f"{len(pdf_paths)} PDFs, {len(texts)} chunks ({chunking.CHUNKING_SIGNATURE})")
+
+    # Keep benchmark tasks out of the server's global index.
+    model.GLOBAL_INDEX_PATH = Path(tempfile.mkdtemp(prefix="bench_global_"))
+    reference = None
+    print(f"{'backend':>10} {'ingest ch/s':>11} {'fixed ch/s':>10} {'dynamic ch/s':>12} {'max cos dist':>12} {'tolerance':>9} {f'recall@{args.k}':>9}")
+    for backend in args.backends:
+        if backend == embedding_backend.EMBEDDING_BACKEND and model.get_embedding_model() is not None:
+            encoder = model.get_embedding_model()
+        else:
+            try:
+                encoder = embedding_backend.load_model(model.EMBEDDING_MODEL_NAME, backend, args.threads)
+            except Exception as e:
+                print(f"{backend:>10} unavailable: {e}")
+                continue
+
+        # A fresh embedding cache so every chunk is encoded.
+        model.EMBEDDING_MODEL = encoder
+        model.EMBEDDING_CACHE = EmbeddingCache(Path(tempfile.mkdtemp(prefix="bench_cache_")), model.EMBEDDING_CACHE.max_bytes)
+        start = time.perf_counter()
+        model.embed_documents(f"bench_embedding_{backend}", corpus_dir, Path(tempfile.mkdtemp(prefix="bench_task_")))
+        ingest_rate = len(texts) / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        encoder.encode(texts, batch_size=args.batch_size, convert_to_numpy=True)
+        fixed_rate = len(texts) / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        vectors = normalize(embedding_backend.encode(encoder, texts))
+        dynamic_rate = len(texts) / (time.perf_counter() - start)
+
+        query_vectors = normalize(embedding_backend.encode(encoder, queries))
+        neighbours = np.argsort(-(query_vectors @ vectors.T), axis=1)[:, :args.k]
+        if reference is None:
+            reference = (vectors, neighbours)
+        max_distance = float(np.max(1 - np.sum(vectors * reference[0], axis=1)))
+        recall = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(neighbours, reference[1])])
+        tolerance = embedding_backend.TOLERANCES[backend]
+        flag = "" if max_distance <= max(tolerance, 1e-6) else " EXCEEDED"
+        print(f"{backend:>10} {ingest_rate:>11.1f} {fixed_rate:>10.1f} {dynamic_rate:>12.1f} "
+              f"{max_distance:>12.2e} {tolerance:>9.0e} {recall:>9.3f}{flag}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Compares cross-task search latency of the global index (one query against
+the shared collection) with a parallel fan-out that queries every task's
+collection and merges by distance, as the number of tasks grows.
+
+    python -m benchmarks.bench_global_search --tasks 1 4 16 64 --pdfs-per-task 3
+"""
+import time
+import random
+import argparse
+import tempfile
+import statistics
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+import model
+from benchmarks.corpus import make_corpus, make_sentence
+
+
+def fan_out_search(executor, tasks, query_embedding, n_results):
+    def query(task):
+        task_name, task_path = task
+        with model.COLLECTIONS.open(task_name, task_path) as collection:
+            result = collection.query(query_embeddings=[query_embedding], n_results=n_results, include=["distances", "metadatas"])
+        return [(d, task_name, m) for d, m in zip(result["distances"][0], result["metadatas"][0])]
+
+    merged = [hit for hits in executor.map(query, tasks) for hit in hits]
+    return sorted(merged, key=lambda hit: hit[0])[:n_results]
+
+
+def percentile(values, p):
+    return statistics.quantiles(values, n=100)[p - 1] if len(values) > 1 else values[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--pdfs-per-task", type=int, default=3)
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--n-results", type=int, default=10)
+    parser.add_argument("--fan-out-workers", type=int, default=8)
+    args = parser.parse_args()
+
+    if model.get_embedding_model() is None:
+        raise SystemExit("Embedding model not loaded.")
+
+    model.SEARCH_RESULTS.max_entries = 0
+    work_dir = Path(tempfile.mkdtemp(prefix="bench_global_"))
+    model.GLOBAL_INDEX_PATH = work_dir / "global_index"
+    max_tasks = max(args.tasks)
+    corpus_dir = Path(tempfile.gettempdir()) / f"bench_corpus_{max_tasks * args.pdfs_per_task}x{args.pages}"
+    pdf_paths = make_corpus(corpus_dir, max_tasks * args.pdfs_per_task, args.pages)
+
+    rng = random.Random(1)
+    queries = [make_sentence(rng) for _ in range(args.queries)]
+    query_embeddings = model._encode_queries(queries)
+
+    tasks = []
+    executor = ThreadPoolExecutor(max_workers=args.fan_out_workers)
+    print(f"{'tasks':>6} {'chunks':>8} {'global p50 ms':>13} {'global p95 ms':>13} {'fan-out p50 ms':>14} {'fan-out p95 ms':>14}")
+    for task_count in sorted(args.tasks):
+        while len(tasks) < task_count:
+            i = len(tasks)
+            task_name = f"bench_task_{i:03d}"
+            bulk_dir = work_dir / task_name / "bulk"
+            bulk_dir.mkdir(parents=True)
+            for pdf_path in pdf_paths[i * args.pdfs_per_task:(i + 1) * args.pdfs_per_task]:
+                (bulk_dir / pdf_path.name).symlink_to(pdf_path)
+            model.embed_documents(task_name, bulk_dir, work_dir / task_name)
+            tasks.append((task_name, work_dir / task_name))
+
+        global_times = []
+        fan_out_times = []
+        for query, embedding in zip(queries, query_embeddings):
+            start = time.perf_counter()
+            model.search_all_tasks(query, args.n_results)
+            global_times.append((time.perf_counter() - start) * 1000)
+            start = time.perf_counter()
+            fan_out_search(executor, tasks, embedding, args.n_results)
+            fan_out_times.append((time.perf_counter() - start) * 1000)
+
+        with model.GLOBAL_INDEX.open(model.GLOBAL_COLLECTION, model.GLOBAL_INDEX_PATH) as collection:
+            chunks = collection.count()
+        print(f"{task_count:>6} {chunks:>8} {percentile(global_times, 50):>13.2f} {percentile(global_times, 95):>13.2f} "
+              f"{percentile(fan_out_times, 50):>14.2f} {percentile(fan_out_times, 95):>14.2f}")
+    executor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Evaluates vector, lexical (BM25) and hybrid (reciprocal rank fusion)
+retrieval on a corpus whose pages each mention a unique part number.
+Two query sets are scored with recall@k (a top-k result is on the right
+page) and latency: part-number lookups, and spans of corpus sentences
+standing in for natural-language selections. Result caches are disabled.
+
+    python -m benchmarks.bench_hybrid --pdfs 20 --pages 10 --queries 200 --k 5
+"""
+import time
+import random
+import argparse
+import tempfile
+import statistics
+from pathlib import Path
+import model
+from embedding_cache import EmbeddingCache
+import chunking
+from benchmarks.corpus import make_corpus, page_code
+
+
+def sentence_queries(pdf_paths, count, rng):
+    sentences = []
+    for pdf_path in pdf_paths:
+        for chunk in chunking.chunk_sentences(pdf_path):
+            words = chunk["text"].split()
+            if len(words) >= 8 and "Reference part" not in chunk["text"]:
+                sentences.append((words, chunk["pdf_name"], chunk["page_number"]))
+    queries = []
+    for words, pdf_name, page_number in rng.sample(sentences, min(count, len(sentences))):
+        length = max(6, int(len(words) * 0.6))
+        start = rng.randint(0, len(words) - length)
+        queries.append((" ".join(words[start:start + length]), pdf_name, page_number))
+    return queries
+
+
+def evaluate(task_name, task_path, queries, mode, k):
+    hits = 0
+    latencies = []
+    for query, pdf_name, page_number in queries:
+        start = time.perf_counter()
+        results = model.get_recommendations(task_name, query, task_path, k, mode=mode)
+        latencies.append((time.perf_counter() - start) * 1000)
+        if any(r["pdf_name"] == pdf_name and r["page_number"] == page_number for r in results):
+            hits += 1
+    latencies.sort()
+    return hits / len(queries), statistics.median(latencies), latencies[int(len(latencies) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdfs", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    if model.get_embedding_model() is None:
+        raise SystemExit("Embedding model not loaded.")
+
+    model.QUERY_EMBEDDINGS.max_entries = 0
+    model.SEARCH_RESULTS.max_entries = 0
+    # Keep benchmark tasks out of the server's global index and embedding cache.
+    model.GLOBAL_INDEX_PATH = Path(tempfile.mkdtemp(prefix="bench_global_"))
+    model.EMBEDDING_CACHE = EmbeddingCache(Path(tempfile.mkdtemp(prefix="bench_cache_")), model.EMBEDDING_CACHE.max_bytes)
+    corpus_dir = Path(tempfile.gettempdir()) / f"bench_coded_corpus_{args.pdfs}x{args.pages}"
+    pdf_paths = make_corpus(corpus_dir, args.pdfs, args.pages, coded=True)
+    task_path = Path(tempfile.mkdtemp(prefix="bench_task_"))
+    task_name = "bench_hybrid"
+    model.embed_documents(task_name, corpus_dir, task_path)
+
+    rng = random.Random(1)
+    pages = [(i, p) for i in range(args.pdfs) for p in range(args.pages)]
+    code_queries = [
+        (page_code(i, p), pdf_paths[i].name, p + 1) for i, p in rng.sample(pages, min(args.queries, len(pages)))
+    ]
+    query_sets = {"part number": code_queries, "sentence": sentence_queries(pdf_paths, args.queries, rng)}
+
+    print(f"{'queries':>12} {'mode':>8} {f'recall@{args.k}':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    for set_name, queries in query_sets.items():
+        for mode in model.SEARCH_MODES:
+            recall, p50, p95 = evaluate(task_name, task_path, queries, mode, args.k)
+            print(f"{set_name:>12} {mode:>8} {recall:>9.3f} {p50:>8.2f} {p95:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Measures how PDF parsing and chunking scales with the number of worker processes.
+
+    python -m benchmarks.bench_parse --pdfs 100 --pages 10
+"""
+import os
+import time
+import argparse
+import tempfile
+from pathlib import Path
+from chunking import iter_pdf_chunks
+from benchmarks.corpus import make_corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdfs", type=int, default=100)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--corpus-dir", type=Path, default=None)
+    args = parser.parse_args()
+
+    corpus_dir = args.corpus_dir or Path(tempfile.gettempdir()) / f"bench_corpus_{args.pdfs}x{args.pages}"
+    pdf_paths = make_corpus(corpus_dir, args.pdfs, args.pages)
+
+    cpu_count = os.cpu_count() or 1
+    worker_counts = sorted({1, 2, 4, 8, cpu_count} & set(range(1, cpu_count + 1)))
+
+    baseline = None
+    reference = None
+    print(f"{'workers':>8} {'seconds':>9} {'chunks':>8} {'speedup':>8}")
+    for workers in worker_counts:
+        # Warm the pool so process start-up is not counted.
+        list(iter_pdf_chunks(pdf_paths[:workers], workers=workers))
+        start = time.perf_counter()
+        results = list(iter_pdf_chunks(pdf_paths, workers=workers))
+        elapsed = time.perf_counter() - start
+
+        chunks = [c for _, pdf_chunks in results for c in pdf_chunks]
+        if reference is None:
+            reference = chunks
+        elif chunks != reference:
+            raise SystemExit(f"Output with {workers} workers differs from the serial output.")
+
+        baseline = baseline or elapsed
+        print(f"{workers:>8} {elapsed:>9.2f} {len(chunks):>8} {baseline / elapsed:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Measures server startup: how long `import main` takes, and for N server
+processes started together, the time until each serves /health/live and
+until /health/ready reports the embedding model loaded, plus each
+process's resident (RSS) and proportional (PSS) memory. Shared weight pages
+count in full towards RSS but are split between processes in PSS.
+
+    python -m benchmarks.bench_startup --workers 2
+    EMBEDDING_MMAP_WEIGHTS=true python -m benchmarks.bench_startup --workers 2
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+import httpx
+
+BASE_PORT = 8700
+
+
+def memory_kb(pid: int) -> dict:
+    """Rss and Pss of a process from /proc (Linux only)."""
+    values = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                name, _, rest = line.partition(":")
+                if name in ("Rss", "Pss"):
+                    values[name] = int(rest.split()[0])
+    except OSError:
+        pass
+    return values
+
+
+def poll(base: str):
+    """Returns the model state from /health/live, or None if not serving yet."""
+    try:
+        return httpx.get(f"{base}/health/live", timeout=1.0).json()["model"]["state"]
+    except httpx.TransportError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--timeout", type=float, default=300.0)
+    args = parser.parse_args()
+
+    # Startup recovers jobs and syncs the catalog and global index, so the
+    # servers get scratch data instead of the real tasks.
+    work_dir = Path(tempfile.mkdtemp(prefix="bench_startup_"))
+    env = {
+        **os.environ,
+        "TASK_DIR": str(work_dir / "tasks"),
+        "GLOBAL_INDEX_DIR": str(work_dir / "global_index"),
+        "TASK_CATALOG_PATH": str(work_dir / "catalog.sqlite3"),
+    }
+
+    processes = []
+    try:
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "import main"], check=True, capture_output=True, env=env)
+        print(f"import main: {time.perf_counter() - start:.2f}s")
+
+        start = time.perf_counter()
+        for i in range(args.workers):
+            port = BASE_PORT + i
+            process = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                env=env,
+            )
+            processes.append((port, process))
+
+        deadline = start + args.timeout
+        live_at = {}
+        ready_at = {}
+        states = {}
+        # Poll every server each round so all are timed from the same start.
+        while len(ready_at) < len(processes) and time.perf_counter() < deadline:
+            for port, _ in processes:
+                if port in ready_at:
+                    continue
+                state = poll(f"http://127.0.0.1:{port}")
+                if state is None:
+                    continue
+                live_at.setdefault(port, time.perf_counter() - start)
+                states[port] = state
+                if state in ("ready", "failed"):
+                    ready_at[port] = time.perf_counter() - start
+            time.sleep(0.05)
+
+        # Memory is read once every process has loaded, so shared pages are split.
+        print(f"{'port':>6} {'live s':>7} {'ready s':>8} {'model':>10} {'rss MB':>8} {'pss MB':>8}")
+        total_pss = 0
+        for port, process in processes:
+            memory = memory_kb(process.pid)
+            total_pss += memory.get("Pss", 0)
+            fmt = lambda v: f"{v:.2f}" if v is not None else "-"
+            print(f"{port:>6} {fmt(live_at.get(port)):>7} {fmt(ready_at.get(port)):>8} {states.get(port, 'timeout'):>10} "
+                  f"{memory.get('Rss', 0) / 1024:>8.1f} {memory.get('Pss', 0) / 1024:>8.1f}")
+        print(f"total pss: {total_pss / 1024:.1f} MB")
+    finally:
+        for _, process in processes:
+            process.terminate()
+        for _, process in processes:
+            process.wait()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
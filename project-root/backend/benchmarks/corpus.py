@@ -0,0 +1,94 @@
+import random
+from pathlib import Path
+from typing import List, Optional
+import fitz
+
+WORDS = (
+    "system data model design network energy market policy research analysis "
+    "process customer product service quality security storage signal battery "
+    "protocol sensor revenue supply chain latency throughput memory index query "
+    "document report summary result method approach value growth risk cost"
+).split()
+
+
+def make_sentence(rng: random.Random) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(8, 20))]
+    return " ".join(words).capitalize() + "."
+
+
+def make_detailed_sentence(rng: random.Random) -> str:
+    """A sentence that may contain decimals and abbreviations, as reports do."""
+    sentence = make_sentence(rng)[:-1]
+    extra = rng.random()
+    if extra < 0.25:
+        sentence += f" rose {rng.randint(1, 99)}.{rng.randint(0, 9)} percent"
+    elif extra < 0.4:
+        sentence += f", e.g. {rng.choice(WORDS)} {rng.choice(WORDS)}"
+    return sentence + "."
+
+
+def make_structured_pdf(path: Path, pages: int, rng: random.Random, paragraphs_per_page: int = 5):
+    """Writes a PDF of headed sections of multi-sentence paragraphs."""
+    doc = fitz.open()
+    for _ in range(pages):
+        page = doc.new_page()
+        y = 50
+        bottom = page.rect.height - 50
+        for i in range(paragraphs_per_page):
+            if i % 2 == 0:
+                heading = " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 5))).title()
+                rect = fitz.Rect(50, y, page.rect.width - 50, bottom)
+                y = bottom - page.insert_textbox(rect, heading, fontsize=13, fontname="hebo") + 6
+            text = " ".join(make_detailed_sentence(rng) for _ in range(rng.randint(3, 7)))
+            rect = fitz.Rect(50, y, page.rect.width - 50, bottom)
+            unused = page.insert_textbox(rect, text, fontsize=9)
+            if unused < 0:
+                break
+            y = bottom - unused + 8
+    doc.save(path)
+    doc.close()
+
+
+def page_code(pdf_index: int, page_index: int) -> str:
+    """A part-number-like identifier unique to one page of a coded corpus."""
+    rng = random.Random(f"{pdf_index}-{page_index}")
+    letters = "".join(rng.choice("ABCDEFGHJKLMNPRSTUVWXYZ") for _ in range(2))
+    return f"{letters}-{rng.randint(1000, 9999)}-{pdf_index}{page_index}"
+
+
+def make_pdf(path: Path, pages: int, rng: random.Random, sentences_per_page: int = 25, pdf_index: Optional[int] = None):
+    """
+    Writes a PDF of random English-like sentences. With `pdf_index`, one
+    sentence on each page mentions that page's page_code.
+    """
+    doc = fitz.open()
+    for page_index in range(pages):
+        page = doc.new_page()
+        sentences = [make_sentence(rng) for _ in range(sentences_per_page)]
+        if pdf_index is not None:
+            sentences.insert(rng.randrange(len(sentences)), f"Reference part {page_code(pdf_index, page_index)} applies here.")
+        text = " ".join(sentences)
+        page.insert_textbox(fitz.Rect(50, 50, page.rect.width - 50, page.rect.height - 50), text, fontsize=9)
+    doc.save(path)
+    doc.close()
+
+
+def make_corpus(out_dir: Path, num_pdfs: int, pages_per_pdf: int, seed: int = 0, structured: bool = False,
+                coded: bool = False) -> List[Path]:
+    """
+    Generates `num_pdfs` synthetic PDFs in `out_dir` and returns their paths.
+    `structured` PDFs have headings and paragraphs instead of one text block
+    per page; `coded` PDFs mention a page_code on every page.
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+    paths = []
+    for i in range(num_pdfs):
+        path = out_dir / f"doc_{i:04d}.pdf"
+        if not path.exists():
+            if structured:
+                make_structured_pdf(path, pages_per_pdf, rng)
+            else:
+                make_pdf(path, pages_per_pdf, rng, pdf_index=i if coded else None)
+        paths.append(path)
+    return paths
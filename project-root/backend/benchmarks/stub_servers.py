@@ -0,0 +1,140 @@
+"""
+Local stand-ins for external services, for benchmarks and manual testing.
+
+    python -m benchmarks.stub_servers --llm-port 9100 --llm-latency 0.5 --tts-port 9200
+
+then start the backend with
+
+    LLM_PROVIDER=openai LLM_BASE_URL=http://127.0.0.1:9100/v1
+    TTS_PROVIDER=azure AZURE_TTS_KEY=stub
+    AZURE_TTS_ENDPOINT=http://127.0.0.1:9200/sts/v1.0/issueToken
+    AZURE_TTS_SPEECH_ENDPOINT=http://127.0.0.1:9200/cognitiveservices/v1
+"""
+import re
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_llm_handler(latency: float):
+    """OpenAI-compatible /v1/chat/completions that answers after `latency` seconds."""
+
+    class StubLLMHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_POST(self):
+            if not self.path.endswith("/chat/completions"):
+                self.send_error(404)
+                return
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            prompt = body["messages"][-1]["content"]
+            time.sleep(latency)
+
+            # Batched prompts ask for a JSON array of a given length.
+            array_match = re.search(r"JSON array with exactly (\d+) strings", prompt)
+            if array_match:
+                count = int(array_match.group(1))
+                content = json.dumps([f"Stub reason {i + 1} for this section." for i in range(count)])
+            else:
+                content = f"Stub response to a {len(prompt)}-character prompt."
+
+            payload = json.dumps({
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}}]
+            }).encode("utf-8")
+            try:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+            except (BrokenPipeError, ConnectionResetError):
+                # The client gave up waiting, e.g. a timeout under test.
+                pass
+
+    return StubLLMHandler
+
+
+def make_tts_handler(latency: float, bytes_per_char: int = 1600, chunk_size: int = 8192):
+    """
+    Fake Azure TTS: issues tokens and answers SSML with silent 16 kHz 16-bit
+    PCM, `bytes_per_char` per character of text, streamed in chunks after an
+    initial `latency`. The handler class counts token and speech requests.
+    """
+
+    class StubTTSHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        token_requests = 0
+        speech_requests = 0
+
+        def log_message(self, format, *args):
+            pass
+
+        def _reply(self, status: int, content_type: str, payload: bytes):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if self.path.endswith("/issueToken"):
+                type(self).token_requests += 1
+                self._reply(200, "text/plain", b"stub-token")
+                return
+            if not self.path.endswith("/cognitiveservices/v1"):
+                self._reply(404, "text/plain", b"not found")
+                return
+            if self.headers.get("Authorization") != "Bearer stub-token":
+                self._reply(401, "text/plain", b"bad token")
+                return
+
+            type(self).speech_requests += 1
+            text = re.sub(r"<[^>]+>", "", body.decode("utf-8"))
+            size = max(len(text.strip()), 1) * bytes_per_char
+            time.sleep(latency)
+            try:
+                self.send_response(200)
+                self.send_header("Content-Type", "audio/x-wav")
+                self.send_header("Content-Length", str(size))
+                self.end_headers()
+                chunk = b"\x00" * chunk_size
+                for start in range(0, size, chunk_size):
+                    self.wfile.write(chunk[:min(chunk_size, size - start)])
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    return StubTTSHandler
+
+
+def start_server(handler, port: int = 0) -> ThreadingHTTPServer:
+    """Serves `handler` on a background thread; port 0 picks a free port."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--llm-port", type=int, default=9100)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--tts-port", type=int, default=9200)
+    parser.add_argument("--tts-latency", type=float, default=0.2)
+    args = parser.parse_args()
+
+    start_server(make_llm_handler(args.llm_latency), args.llm_port)
+    print(f"Stub LLM listening on http://127.0.0.1:{args.llm_port}/v1")
+    start_server(make_tts_handler(args.tts_latency), args.tts_port)
+    print(f"Stub TTS listening on http://127.0.0.1:{args.tts_port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
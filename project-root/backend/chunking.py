@@ -0,0 +1,377 @@
+import os
+import re
+import time
+import queue
+import threading
+import multiprocessing
+from collections import Counter
+from pathlib import Path
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from typing import List, Dict, Any, Callable, Iterator, Iterable, Optional, Tuple
+import fitz
+import metrics
+
+# PDF parsing is CPU bound, so it is fanned out over a process pool.
+# This module deliberately avoids importing the embedding model so that
+# pool workers start quickly.
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", str(os.cpu_count() or 1)))
+# PDFs longer than this are split into page ranges parsed in parallel.
+PARSE_PAGES_PER_TASK = int(os.getenv("PARSE_PAGES_PER_TASK", "50"))
+# "structured" packs whole sentences from PyMuPDF text blocks into windows
+# of at most CHUNK_MAX_TOKENS tokens, breaking at headings; "sentence" is the
+# original one-chunk-per-'.' splitter.
+CHUNKER = os.getenv("CHUNKER", "structured")
+# all-MiniLM-L6-v2 truncates input at 256 word pieces. Tokens are estimated
+# from words and punctuation, so the default leaves room for sub-word splits.
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "200"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+if not 0 <= CHUNK_OVERLAP_TOKENS < CHUNK_MAX_TOKENS:
+    raise ValueError(
+        f"CHUNK_OVERLAP_TOKENS ({CHUNK_OVERLAP_TOKENS}) must be at least 0 and less than CHUNK_MAX_TOKENS ({CHUNK_MAX_TOKENS})."
+    )
+# Blocks at least this much larger than the body font are treated as headings.
+HEADING_FONT_RATIO = 1.15
+HEADING_MAX_WORDS = 16
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+# Sentence ends followed by whitespace and something that can start a
+# sentence, so decimals ("3.5") and most abbreviations ("e.g. the") stay put.
+_SENTENCE_END_RE = re.compile(r'(?<=[.!?])\s+(?=["\'(\[]?[A-Z0-9])')
+
+
+# Seconds spent per stage by the page range being chunked on this thread.
+# Parse workers are separate processes, so the times are returned with the
+# chunks and recorded in the server's metrics by iter_pdf_chunks.
+_range_stage_times = threading.local()
+
+@contextmanager
+def _timed(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        times = getattr(_range_stage_times, "times", None)
+        if times is not None:
+            times[stage] = times.get(stage, 0.0) + time.perf_counter() - start
+
+def preprocess_text(text: str) -> str:
+    """Cleans and normalizes text for better embedding quality."""
+    text = re.sub(r'(\w+)-\n(\w+)', r'\1\2', text)
+    text = re.sub(r'\n+', ' ', text).strip()
+    text = re.sub(r'\s+', ' ', text).strip()
+    return text
+
+def count_tokens(text: str) -> int:
+    """Cheap estimate of the model's token count: words plus punctuation."""
+    return len(_TOKEN_RE.findall(text))
+
+def split_sentences(text: str) -> List[str]:
+    return [s.strip() for s in _SENTENCE_END_RE.split(text) if s.strip()]
+
+def chunk_sentences(pdf_path: Path, start_page: int = 0, end_page: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Extracts and chunks text from a PDF, splitting by paragraph.
+    Only pages in [start_page, end_page) are read when a range is given.
+    """
+    chunks: List[Dict[str, Any]] = []
+    try:
+        doc = fitz.open(pdf_path)
+        end_page = doc.page_count if end_page is None else min(end_page, doc.page_count)
+        for page_index in range(start_page, end_page):
+            with _timed("pdf_parse"):
+                text = doc[page_index].get_text()
+
+            with _timed("chunk"):
+                cleaned_text = preprocess_text(text)
+
+                paragraphs = [p.strip() for p in cleaned_text.split('.') if p.strip()]
+
+                for para in paragraphs:
+                    chunks.append({
+                        "text": para,
+                        "pdf_name": pdf_path.name,
+                        "page_number": page_index + 1
+                    })
+        doc.close()
+    except Exception as e:
+        print(f"Error parsing PDF {pdf_path}: {e}")
+    return chunks
+
+def _page_blocks(page: fitz.Page) -> List[Tuple[str, float, bool]]:
+    """Returns (text, largest font size, all bold) for each text block on a page."""
+    blocks = []
+    for block in page.get_text("dict")["blocks"]:
+        if block.get("type") != 0:
+            continue
+        lines = []
+        sizes = []
+        bold = True
+        for line in block["lines"]:
+            spans = [span for span in line["spans"] if span["text"].strip()]
+            if not spans:
+                continue
+            lines.append("".join(span["text"] for span in line["spans"]))
+            sizes.extend(span["size"] for span in spans)
+            bold = bold and all(span["flags"] & 16 for span in spans)
+        text = preprocess_text("\n".join(lines))
+        if text:
+            blocks.append((text, max(sizes), bold))
+    return blocks
+
+def _body_font_size(pages: List[List[Tuple[str, float, bool]]]) -> float:
+    """The font size covering the most characters, taken to be body text."""
+    sizes: Counter = Counter()
+    for blocks in pages:
+        for text, size, _ in blocks:
+            sizes[round(size, 1)] += len(text)
+    return sizes.most_common(1)[0][0] if sizes else 0.0
+
+def _split_long(sentence: str, max_tokens: int) -> List[str]:
+    words = sentence.split()
+    pieces, current, current_tokens = [], [], 0
+    for word in words:
+        tokens = count_tokens(word)
+        if current and current_tokens + tokens > max_tokens:
+            pieces.append(" ".join(current))
+            current, current_tokens = [], 0
+        current.append(word)
+        current_tokens += tokens
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+def chunk_structured(pdf_path: Path, start_page: int = 0, end_page: Optional[int] = None,
+                     max_tokens: Optional[int] = None, overlap_tokens: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Chunks a PDF by its layout: sentences from consecutive text blocks are
+    packed into windows of at most `max_tokens` tokens, each starting with
+    the last `overlap_tokens` tokens' worth of sentences of the previous one.
+    Headings close the current window so chunks do not straddle sections.
+    A chunk is attributed to the page it starts on.
+    """
+    max_tokens = CHUNK_MAX_TOKENS if max_tokens is None else max_tokens
+    overlap_tokens = CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+    if not 0 <= overlap_tokens < max_tokens:
+        raise ValueError(f"overlap_tokens ({overlap_tokens}) must be at least 0 and less than max_tokens ({max_tokens}).")
+    chunks: List[Dict[str, Any]] = []
+    try:
+        with _timed("pdf_parse"), fitz.open(pdf_path) as doc:
+            end_page = doc.page_count if end_page is None else min(end_page, doc.page_count)
+            pages = [_page_blocks(doc[i]) for i in range(start_page, end_page)]
+    except Exception as e:
+        print(f"Error parsing PDF {pdf_path}: {e}")
+        return chunks
+
+    with _timed("chunk"):
+        return _pack_windows(pdf_path, pages, start_page, max_tokens, overlap_tokens)
+
+def _pack_windows(pdf_path: Path, pages: List[List[Tuple[str, float, bool]]], start_page: int,
+                  max_tokens: int, overlap_tokens: int) -> List[Dict[str, Any]]:
+    chunks: List[Dict[str, Any]] = []
+    body_size = _body_font_size(pages)
+    window: List[Tuple[str, int]] = []
+    window_tokens = 0
+    window_page = start_page + 1
+    fresh = 0  # sentences in the window not carried over from the previous chunk
+
+    def flush(keep_overlap: bool):
+        nonlocal window, window_tokens, fresh
+        if fresh:
+            chunks.append({
+                "text": " ".join(text for text, _ in window),
+                "pdf_name": pdf_path.name,
+                "page_number": window_page,
+            })
+        kept: List[Tuple[str, int]] = []
+        kept_tokens = 0
+        if keep_overlap:
+            for text, tokens in reversed(window):
+                if kept_tokens + tokens > overlap_tokens:
+                    break
+                kept.insert(0, (text, tokens))
+                kept_tokens += tokens
+        window, window_tokens, fresh = kept, kept_tokens, 0
+
+    for page_offset, blocks in enumerate(pages):
+        page_number = start_page + page_offset + 1
+        for text, size, bold in blocks:
+            is_heading = len(text.split()) <= HEADING_MAX_WORDS and (
+                size >= body_size * HEADING_FONT_RATIO or (bold and not text.endswith("."))
+            )
+            if is_heading:
+                flush(keep_overlap=False)
+            for sentence in split_sentences(text):
+                for piece in _split_long(sentence, max_tokens):
+                    tokens = count_tokens(piece)
+                    if fresh and window_tokens + tokens > max_tokens:
+                        flush(keep_overlap=True)
+                    # Carried-over sentences give way so the window stays within max_tokens.
+                    while len(window) > fresh and window_tokens + tokens > max_tokens:
+                        window_tokens -= window.pop(0)[1]
+                    if not fresh:
+                        window_page = page_number
+                    window.append((piece, tokens))
+                    window_tokens += tokens
+                    fresh += 1
+    flush(keep_overlap=False)
+    return chunks
+
+CHUNKERS = {
+    "sentence": chunk_sentences,
+    "structured": chunk_structured,
+}
+if CHUNKER not in CHUNKERS:
+    raise ValueError(f"Unknown CHUNKER {CHUNKER!r}; expected one of {sorted(CHUNKERS)}")
+
+# Identifies how text is split into chunks; bump the version whenever a
+# chunker changes so cached embeddings of the old chunks are not reused.
+# Structured chunks depend on PARSE_PAGES_PER_TASK too: font statistics and
+# windows restart at each page range. Sentence chunks never span pages.
+if CHUNKER == "sentence":
+    CHUNKING_SIGNATURE = "sentence-split-v1"
+else:
+    CHUNKING_SIGNATURE = f"{CHUNKER}-v2-{CHUNK_MAX_TOKENS}-{CHUNK_OVERLAP_TOKENS}-{PARSE_PAGES_PER_TASK}"
+
+def chunk_text(pdf_path: Path, start_page: int = 0, end_page: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Chunks pages [start_page, end_page) of a PDF with the configured CHUNKER."""
+    return CHUNKERS[CHUNKER](pdf_path, start_page, end_page)
+
+def _chunk_range(work: Tuple[Path, Optional[int], Optional[int]]) -> Tuple[List[Dict[str, Any]], Dict[str, float]]:
+    """Chunks one page range, also returning the seconds spent in each stage."""
+    pdf_path, start_page, end_page = work
+    if start_page is None:
+        return [], {}
+    _range_stage_times.times = {}
+    try:
+        chunks = chunk_text(pdf_path, start_page, end_page)
+        return chunks, _range_stage_times.times
+    finally:
+        _range_stage_times.times = None
+
+def _page_count(pdf_path: Path) -> int:
+    try:
+        with fitz.open(pdf_path) as doc:
+            return doc.page_count
+    except Exception:
+        # Let chunk_text report the error when the range is parsed.
+        return 0
+
+def _split_work(pdf_paths: Iterable[Path], skip: Optional[Callable[[Path], bool]] = None) -> Iterator[Tuple[Path, Optional[int], Optional[int]]]:
+    for pdf_path in pdf_paths:
+        if skip is not None and skip(pdf_path):
+            # A start of None marks a PDF that is passed through unparsed.
+            yield pdf_path, None, None
+            continue
+        page_count = _page_count(pdf_path)
+        if page_count <= PARSE_PAGES_PER_TASK:
+            yield pdf_path, 0, None
+            continue
+        for start in range(0, page_count, PARSE_PAGES_PER_TASK):
+            end = start + PARSE_PAGES_PER_TASK
+            # The last range of a PDF always ends at None.
+            yield pdf_path, start, end if end < page_count else None
+
+_WORK_DONE = object()
+
+def _submit(workers: int, item: Tuple[Path, Optional[int], Optional[int]]) -> Future:
+    try:
+        return _get_pool(workers).submit(_chunk_range, item)
+    except BrokenProcessPool:
+        # _get_pool replaces the pool once it has noticed the break.
+        return _get_pool(workers).submit(_chunk_range, item)
+
+def _ordered_map(workers: int, work: Iterable[Tuple[Path, Optional[int], Optional[int]]], window: int):
+    """
+    Like pool.map over the shared parse pool, but keeps at most `window`
+    ranges in flight so parsed chunks never pile up faster than the caller
+    consumes them. `work` is consumed on its own thread, so finished ranges
+    are handed back even while it waits for more input, such as PDFs still
+    being uploaded. If a worker dies (a crash in MuPDF, or the OOM killer),
+    its pool is replaced and each range it lost is retried once.
+    """
+    in_flight: queue.Queue = queue.Queue()
+    slots = threading.Semaphore(window)
+    stop = threading.Event()
+
+    def submit_work():
+        try:
+            for item in work:
+                slots.acquire()
+                if stop.is_set():
+                    return
+                in_flight.put((item, _submit(workers, item) if item[1] is not None else None))
+            in_flight.put(_WORK_DONE)
+        except Exception as e:
+            in_flight.put(e)
+
+    threading.Thread(target=submit_work, name="parse-submit", daemon=True).start()
+    try:
+        while True:
+            entry = in_flight.get()
+            if entry is _WORK_DONE:
+                return
+            if isinstance(entry, Exception):
+                raise entry
+            item, future = entry
+            try:
+                result = future.result() if future is not None else ([], {})
+            except BrokenProcessPool:
+                print(f"Parse worker died while parsing {item[0].name}; retrying on a new pool.")
+                result = _submit(workers, item).result()
+            slots.release()
+            yield item, result
+    finally:
+        stop.set()
+        slots.release()
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    """Returns the shared parse pool, recreating it if the worker count changed or a worker died."""
+    global _pool, _pool_workers
+    with _pool_lock:
+        # A pool whose worker died fails every later submit.
+        if _pool is None or _pool_workers != workers or _pool._broken:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            # 'spawn' keeps workers independent of the server's threads and
+            # of the already loaded embedding model.
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _pool_workers = workers
+        return _pool
+
+def iter_pdf_chunks(pdf_paths: Iterable[Path], workers: Optional[int] = None,
+                    skip: Optional[Callable[[Path], bool]] = None) -> Iterator[Tuple[Path, Optional[List[Dict[str, Any]]]]]:
+    """
+    Parses PDFs in parallel and yields (pdf_path, chunks) for each PDF, in the
+    order the paths were given. Results stream back as soon as the next PDF
+    in order is complete, so callers can start embedding early, and only a
+    bounded number of page ranges is parsed ahead of the caller.
+    PDFs for which `skip(pdf_path)` is true are not parsed; they are yielded
+    in their place with None for chunks, and count towards that bound.
+    """
+    workers = PARSE_WORKERS if workers is None else workers
+    work = _split_work(pdf_paths, skip)
+
+    if workers <= 1:
+        results: Iterator[Tuple[Tuple[Path, Optional[int], Optional[int]], Tuple[List[Dict[str, Any]], Dict[str, float]]]] = (
+            (item, _chunk_range(item)) for item in work
+        )
+    else:
+        results = _ordered_map(workers, work, window=2 * workers)
+
+    pending: List[Dict[str, Any]] = []
+    for (pdf_path, start_page, end_page), (chunks, stage_times) in results:
+        if start_page is None:
+            yield pdf_path, None
+            continue
+        for stage, seconds in stage_times.items():
+            metrics.observe_stage(stage, seconds, items=len(chunks) if stage == "chunk" else 0)
+        pending.extend(chunks)
+        if end_page is None:
+            yield pdf_path, pending
+            pending = []
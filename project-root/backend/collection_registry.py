@@ -0,0 +1,115 @@
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+from chromadb import PersistentClient
+from chromadb.api.shared_system_client import SharedSystemClient
+
+# Rough resident cost of one chunk: a float32 MiniLM vector plus its HNSW
+# links, document text and metadata.
+BYTES_PER_CHUNK = 2048
+
+
+class _OpenCollection:
+    def __init__(self, client: PersistentClient, collection: Any, estimated_bytes: int):
+        self.client = client
+        self.system = client._system
+        self.collection = collection
+        self.estimated_bytes = estimated_bytes
+        self.in_use = 0
+        self.stale = False
+
+
+def _release(entry: _OpenCollection, stop: bool):
+    # Chroma keeps one System per persist directory for the life of the
+    # process. Dropping it from that cache lets the index be freed; handles
+    # already given out keep working until their users finish.
+    systems = SharedSystemClient._identifier_to_system
+    if systems.get(entry.client._identifier) is entry.system:
+        del systems[entry.client._identifier]
+    if stop:
+        try:
+            entry.system.stop()
+        except Exception as e:
+            print(f"Error closing Chroma client: {e}")
+
+
+def _apply_ef_search(collection: Any, configuration: Dict[str, Any]):
+    ef_search = configuration.get("hnsw", {}).get("ef_search")
+    current = (collection.configuration_json or {}).get("hnsw") or {}
+    if ef_search is not None and current.get("ef_search") != ef_search:
+        collection.modify(configuration={"hnsw": {"ef_search": ef_search}})
+
+
+class CollectionRegistry:
+    """
+    Process-wide cache of open task collections, so queries do not reopen
+    the SQLite and HNSW files on every request. Least recently used
+    collections are closed once more than `max_open` are open or their
+    estimated size exceeds `max_bytes`; collections in use are never closed.
+
+    If given, `configuration(task_path)` returns the Chroma collection
+    configuration new collections are created with. Its HNSW ef_search is
+    also applied to existing collections when they are opened.
+    """
+
+    def __init__(self, max_open: int, max_bytes: int,
+                 configuration: Optional[Callable[[Path], Optional[Dict[str, Any]]]] = None):
+        self.max_open = max_open
+        self.max_bytes = max_bytes
+        self.configuration = configuration
+        self._entries: "OrderedDict[str, _OpenCollection]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def open(self, task_name: str, task_path: Path) -> Iterator[Any]:
+        """Yields the task's collection, creating it if needed."""
+        key = str(task_path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                client = PersistentClient(path=str(task_path / "chroma"))
+                configuration = self.configuration(task_path) if self.configuration else None
+                collection = client.get_or_create_collection(name=task_name, configuration=configuration)
+                if configuration:
+                    _apply_ef_search(collection, configuration)
+                entry = _OpenCollection(client, collection, collection.count() * BYTES_PER_CHUNK)
+                self._entries[key] = entry
+            self._entries.move_to_end(key)
+            entry.in_use += 1
+            self._evict()
+        try:
+            yield entry.collection
+        finally:
+            with self._lock:
+                entry.in_use -= 1
+                if entry.stale and entry.in_use == 0:
+                    _release(entry, stop=True)
+
+    def invalidate(self, task_path: Path):
+        """Closes the task's collection so the next open sees a fresh handle."""
+        with self._lock:
+            entry = self._entries.pop(str(task_path), None)
+            if entry is not None:
+                self._close(entry)
+
+    def _close(self, entry: _OpenCollection):
+        if entry.in_use:
+            # Stop it once the last user is done.
+            entry.stale = True
+            _release(entry, stop=False)
+        else:
+            _release(entry, stop=True)
+
+    def _evict(self):
+        total = sum(e.estimated_bytes for e in self._entries.values())
+        for key in list(self._entries):
+            if len(self._entries) <= self.max_open and total <= self.max_bytes:
+                break
+            entry = self._entries[key]
+            if entry.in_use:
+                continue
+            del self._entries[key]
+            total -= entry.estimated_bytes
+            self._close(entry)
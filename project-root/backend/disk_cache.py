@@ -0,0 +1,97 @@
+import os
+import threading
+from pathlib import Path
+from typing import List, Optional
+
+
+def cache_files(cache_dir: Path, suffix: str) -> List[os.DirEntry]:
+    if not cache_dir.exists():
+        return []
+    return [e for e in os.scandir(cache_dir) if e.name.endswith(suffix)]
+
+
+def total_size(cache_dir: Path, suffix: str) -> int:
+    size = 0
+    for entry in cache_files(cache_dir, suffix):
+        try:
+            size += entry.stat().st_size
+        except FileNotFoundError:
+            pass
+    return size
+
+
+def touch(path: Path):
+    """Marks a cache file as recently used."""
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+
+
+def evict_lru(cache_dir: Path, suffix: str, max_bytes: int):
+    """
+    Deletes the least recently used files (by mtime) ending in `suffix`
+    until the files left in `cache_dir` fit in `max_bytes`.
+    """
+    entries = []
+    for entry in cache_files(cache_dir, suffix):
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except FileNotFoundError:
+            pass
+
+
+class BlobCache:
+    """
+    On-disk cache of byte strings, one file per key in `cache_dir`, written
+    atomically. Entries are evicted least recently used first once the cache
+    exceeds `max_bytes`; a `max_bytes` of zero or less disables it.
+    Subclasses name their files' SUFFIX and derive keys.
+    """
+
+    SUFFIX = ".blob"
+    # Shown in error messages.
+    KIND = "cache"
+
+    def __init__(self, cache_dir: Path, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}{self.SUFFIX}"
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        touch(path)
+        return data
+
+    def put(self, key: str, data: bytes):
+        if self.max_bytes <= 0:
+            return
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        try:
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error writing {self.KIND} entry {path.name}: {e}")
+            tmp_path.unlink(missing_ok=True)
+            return
+        with self._lock:
+            evict_lru(self.cache_dir, self.SUFFIX, self.max_bytes)
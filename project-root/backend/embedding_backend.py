@@ -0,0 +1,115 @@
+import os
+from pathlib import Path
+from typing import List, Optional, TYPE_CHECKING
+import numpy as np
+from chunking import count_tokens
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+# torch and sentence_transformers are imported when a model is loaded, not
+# when this module is, so the server can start serving before they are.
+
+# "torch" runs the original PyTorch weights; "onnx" and "onnx-int8" run the
+# exported ONNX graphs shipped in the model repo through ONNX Runtime, which
+# needs `pip install optimum[onnxruntime]`.
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+# Intra-op threads for the encoder; 0 keeps the library default (all cores).
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))
+# Padded tokens per encoder batch: short texts are batched many at a time,
+# long ones a few at a time.
+EMBED_TOKEN_BUDGET = int(os.getenv("EMBED_TOKEN_BUDGET", "8192"))
+
+ONNX_FILES = {
+    "onnx": "onnx/model.onnx",
+    # AVX2 build; model_qint8_avx512.onnx or model_qint8_arm64.onnx suit other
+    # CPUs and can be chosen with EMBEDDING_ONNX_FILE.
+    "onnx-int8": "onnx/model_quint8_avx2.onnx",
+}
+
+# Largest cosine distance from the torch backend's vectors each backend is
+# expected to stay within; benchmarks/bench_embedding.py checks it.
+TOLERANCES = {
+    "torch": 0.0,
+    "onnx": 1e-4,
+    "onnx-int8": 2e-2,
+}
+
+
+def share_weights(model: "SentenceTransformer", weights_path: Path):
+    """
+    Swaps the model's parameters for memory-mapped copies saved at
+    `weights_path` (written on first use). The mapped pages are read-only
+    and backed by the page cache, so every worker process that maps the same
+    file shares one copy of the weights instead of holding its own.
+    """
+    import torch
+    if not weights_path.exists():
+        weights_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = weights_path.with_suffix(f".{os.getpid()}.tmp")
+        torch.save(model.state_dict(), tmp_path)
+        os.replace(tmp_path, weights_path)
+    state = torch.load(weights_path, mmap=True, weights_only=True)
+    model.load_state_dict(state, assign=True)
+
+
+def load_model(model_name: str, backend: str = EMBEDDING_BACKEND, threads: int = EMBEDDING_THREADS,
+               weights_path: Optional[Path] = None) -> "SentenceTransformer":
+    """
+    Loads the encoder for `backend`. With `weights_path`, torch weights are
+    memory-mapped from that file (see share_weights).
+    """
+    if backend not in TOLERANCES:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND {backend!r}; expected one of {sorted(TOLERANCES)}")
+    import torch
+    from sentence_transformers import SentenceTransformer
+    if threads > 0:
+        torch.set_num_threads(threads)
+    if backend == "torch":
+        model = SentenceTransformer(model_name, device='cpu')
+        if weights_path is not None:
+            try:
+                share_weights(model, weights_path)
+            except Exception as e:
+                print(f"Could not memory-map model weights from {weights_path}, using private copy: {e}")
+        return model
+
+    import onnxruntime as ort
+    session_options = ort.SessionOptions()
+    if threads > 0:
+        session_options.intra_op_num_threads = threads
+        session_options.inter_op_num_threads = 1
+    return SentenceTransformer(
+        model_name,
+        device='cpu',
+        backend="onnx",
+        model_kwargs={
+            "file_name": os.getenv("EMBEDDING_ONNX_FILE", ONNX_FILES[backend]),
+            "provider": "CPUExecutionProvider",
+            "session_options": session_options,
+        },
+    )
+
+
+def encode(model: "SentenceTransformer", texts: List[str], token_budget: int = EMBED_TOKEN_BUDGET) -> np.ndarray:
+    """
+    Encodes `texts` in length-sorted batches of at most `token_budget` padded
+    tokens and returns the vectors in input order. Sorting keeps padding
+    small, and sizing batches by tokens keeps memory flat across lengths.
+    """
+    if not texts:
+        return np.zeros((0, model.get_sentence_embedding_dimension()), dtype=np.float32)
+    max_length = model.max_seq_length
+    # +2 for the [CLS] and [SEP] tokens.
+    lengths = [min(count_tokens(text) + 2, max_length) for text in texts]
+    order = sorted(range(len(texts)), key=lambda i: -lengths[i])
+    vectors: List[np.ndarray] = [None] * len(texts)
+    start = 0
+    while start < len(order):
+        # The first text of a batch is its longest, so it sets the padding.
+        batch = order[start:start + max(1, token_budget // lengths[order[start]])]
+        encoded = model.encode([texts[i] for i in batch], batch_size=len(batch), convert_to_numpy=True)
+        for i, vector in zip(batch, encoded):
+            vectors[i] = vector
+        start += len(batch)
+    return np.asarray(vectors, dtype=np.float32)
@@ -0,0 +1,79 @@
+import io
+import hashlib
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+import disk_cache
+
+
+def file_sha256(path: Path, block_size: int = 1 << 20) -> str:
+    """Returns the hex SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class EmbeddingCache(disk_cache.BlobCache):
+    """
+    On-disk cache of a PDF's chunks and their vectors, keyed by the PDF's
+    content hash plus the embedding model and chunking settings, stored as
+    .npz archives.
+    """
+
+    SUFFIX = ".npz"
+    KIND = "embedding cache"
+
+    def __init__(self, cache_dir: Path, max_bytes: int):
+        super().__init__(cache_dir, max_bytes)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(content_hash: str, model_name: str, chunking: str) -> str:
+        return hashlib.sha256(f"{content_hash}|{model_name}|{chunking}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Tuple[List[str], List[int], np.ndarray]]:
+        """Returns (texts, page_numbers, vectors) for a cached PDF, or None."""
+        data = super().get(key)
+        result = None
+        if data is not None:
+            try:
+                with np.load(io.BytesIO(data), allow_pickle=False) as entry:
+                    result = (entry["texts"].tolist(), entry["pages"].tolist(), entry["vectors"])
+            except Exception as e:
+                path = self._path(key)
+                print(f"Discarding unreadable embedding cache entry {path.name}: {e}")
+                path.unlink(missing_ok=True)
+        with self._lock:
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return result
+
+    def put(self, key: str, texts: List[str], pages: List[int], vectors: np.ndarray):
+        buffer = io.BytesIO()
+        np.savez(
+            buffer,
+            texts=np.array(texts, dtype=str),
+            pages=np.array(pages, dtype=np.int32),
+            vectors=np.asarray(vectors, dtype=np.float32),
+        )
+        super().put(key, buffer.getvalue())
+
+    def stats(self) -> Dict[str, Any]:
+        entries = disk_cache.cache_files(self.cache_dir, self.SUFFIX)
+        size_bytes = disk_cache.total_size(self.cache_dir, self.SUFFIX)
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / lookups, 3) if lookups else None,
+            "entries": len(entries),
+            "size_bytes": size_bytes,
+            "max_bytes": self.max_bytes,
+        }
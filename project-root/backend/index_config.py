@@ -0,0 +1,87 @@
+import os
+import json
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+CONFIG_FILE = "index_config.json"
+SPACES = ("l2", "cosine", "ip")
+QUANTIZATIONS = ("none", "int8")
+# Settings the HNSW graph is built with; they cannot change once the task's
+# collection exists. ef_search, quantization and rerank_factor can.
+BUILD_SETTINGS = ("space", "hnsw_m", "ef_construction")
+
+# Chroma's own defaults, used by tasks indexed before they could be configured.
+LEGACY_CONFIG: Dict[str, Any] = {
+    "space": "l2", "hnsw_m": 16, "ef_construction": 100, "ef_search": 100, "quantization": "none", "rerank_factor": 4,
+}
+
+# Defaults for new tasks:
+# INDEX_SPACE: distance metric, "l2", "cosine" or "ip" (inner product).
+# HNSW_M: links per node; more raises recall and memory.
+# HNSW_EF_CONSTRUCTION: candidate list size while building; more raises recall and build time.
+# HNSW_EF_SEARCH: candidate list size while querying; more raises recall and latency.
+# VECTOR_QUANTIZATION: "int8" answers queries from an int8 copy of the
+#   vectors instead of Chroma's HNSW index (see quantized_index.py).
+# RERANK_FACTOR: with int8, candidates per result re-scored with the exact vectors.
+DEFAULT_CONFIG: Dict[str, Any] = {
+    "space": os.getenv("INDEX_SPACE", LEGACY_CONFIG["space"]),
+    "hnsw_m": int(os.getenv("HNSW_M", LEGACY_CONFIG["hnsw_m"])),
+    "ef_construction": int(os.getenv("HNSW_EF_CONSTRUCTION", LEGACY_CONFIG["ef_construction"])),
+    "ef_search": int(os.getenv("HNSW_EF_SEARCH", LEGACY_CONFIG["ef_search"])),
+    "quantization": os.getenv("VECTOR_QUANTIZATION", LEGACY_CONFIG["quantization"]),
+    "rerank_factor": int(os.getenv("RERANK_FACTOR", LEGACY_CONFIG["rerank_factor"])),
+}
+
+
+class FrozenSettingError(ValueError):
+    """Raised when a setting the HNSW graph was built with is changed."""
+
+
+def validate(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Returns `config` if every setting is known and in range; raises ValueError otherwise."""
+    unknown = set(config) - set(LEGACY_CONFIG)
+    if unknown:
+        raise ValueError(f"Unknown index settings: {', '.join(sorted(unknown))}.")
+    if config["space"] not in SPACES:
+        raise ValueError(f"space must be one of {', '.join(SPACES)}.")
+    if config["quantization"] not in QUANTIZATIONS:
+        raise ValueError(f"quantization must be one of {', '.join(QUANTIZATIONS)}.")
+    for name, low, high in (("hnsw_m", 2, 128), ("ef_construction", 1, 4096), ("ef_search", 1, 4096), ("rerank_factor", 1, 100)):
+        if not isinstance(config[name], int) or not low <= config[name] <= high:
+            raise ValueError(f"{name} must be an integer from {low} to {high}.")
+    return config
+
+
+def load(task_path: Path) -> Dict[str, Any]:
+    """The task's index settings, falling back to the defaults for settings it does not set."""
+    config_path = task_path / CONFIG_FILE
+    base = LEGACY_CONFIG if (task_path / "chroma").exists() else DEFAULT_CONFIG
+    try:
+        return {**base, **json.loads(config_path.read_text())}
+    except FileNotFoundError:
+        return dict(base)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Error reading index settings for {task_path.name}: {e}")
+        return dict(base)
+
+
+def save(task_path: Path, config: Dict[str, Any]):
+    tmp_path = task_path / (CONFIG_FILE + ".tmp")
+    tmp_path.write_text(json.dumps(config, indent=4))
+    os.replace(tmp_path, task_path / CONFIG_FILE)
+
+
+def chroma_configuration(config: Dict[str, Any]) -> Dict[str, Any]:
+    """The collection configuration Chroma is given for these settings."""
+    return {
+        "hnsw": {
+            "space": config["space"],
+            "max_neighbors": config["hnsw_m"],
+            "ef_construction": config["ef_construction"],
+            "ef_search": config["ef_search"],
+        }
+    }
+
+
+def collection_configuration(task_path: Path) -> Optional[Dict[str, Any]]:
+    return chroma_configuration(load(task_path))
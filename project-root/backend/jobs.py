@@ -0,0 +1,170 @@
+import os
+import json
+import time
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, List, Optional
+
+# Ingestion runs on a small, bounded pool of worker threads so the upload
+# request can return immediately and the event loop stays free.
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_MAX_PENDING = int(os.getenv("INGEST_MAX_PENDING", "16"))
+
+JOB_FILE = "job.json"
+
+_executor = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="ingest")
+_jobs: Dict[str, "JobRecord"] = {}
+_jobs_lock = threading.Lock()
+# Called with (job, changed fields) after every update.
+_listeners: List[Callable[["JobRecord", Dict[str, Any]], None]] = []
+
+
+class QueueFullError(Exception):
+    """Raised when too many ingestion jobs are already waiting."""
+
+
+class JobRecord:
+    """
+    Persistent progress record for one task's ingestion, stored as job.json
+    in the task directory. Status is 'processing', 'ready' or 'failed';
+    'stage' gives a finer view while processing.
+    """
+
+    def __init__(self, task_path: Path, data: Dict[str, Any]):
+        self.task_path = task_path
+        self.data = data
+        self._lock = threading.Lock()
+
+    @classmethod
+    def create(cls, task_path: Path) -> "JobRecord":
+        job = cls(task_path, {
+            "task_name": task_path.name,
+            "status": "processing",
+            "stage": "queued",
+            "pdfs_total": 0,
+            "pdfs_parsed": 0,
+            "pdfs_cached": 0,
+            "chunks_total": 0,
+            "chunks_embedded": 0,
+            "queued_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "error": None,
+        })
+        job._save()
+        return job
+
+    @classmethod
+    def load(cls, task_path: Path) -> Optional["JobRecord"]:
+        job_file = task_path / JOB_FILE
+        if not job_file.exists():
+            return None
+        try:
+            return cls(task_path, json.loads(job_file.read_text()))
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Error reading job record for {task_path.name}: {e}")
+            return None
+
+    def update(self, **fields):
+        """Merges the given fields into the record and persists it."""
+        with self._lock:
+            self.data.update(fields)
+            self._save()
+        for listener in _listeners:
+            try:
+                listener(self, fields)
+            except Exception as e:
+                print(f"Error in job listener for {self.task_path.name}: {e}")
+
+    def _save(self):
+        tmp_file = self.task_path / (JOB_FILE + ".tmp")
+        tmp_file.write_text(json.dumps(self.data, indent=4))
+        os.replace(tmp_file, self.task_path / JOB_FILE)
+
+    @property
+    def status(self) -> str:
+        return self.data.get("status", "processing")
+
+    def fraction_done(self) -> float:
+        """Rough completion fraction, weighting parsing and embedding equally."""
+        if self.status == "ready":
+            return 1.0
+        pdfs_total = self.data.get("pdfs_total") or 0
+        chunks_total = self.data.get("chunks_total") or 0
+        parsed = self.data.get("pdfs_parsed", 0) / pdfs_total if pdfs_total else 0.0
+        embedded = self.data.get("chunks_embedded", 0) / chunks_total if chunks_total else 0.0
+        return (parsed + embedded) / 2
+
+    def eta_seconds(self) -> Optional[float]:
+        started_at = self.data.get("started_at")
+        if self.status != "processing" or not started_at:
+            return None
+        fraction = self.fraction_done()
+        if fraction <= 0:
+            return None
+        elapsed = time.time() - started_at
+        return round(elapsed * (1 - fraction) / fraction, 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            result = dict(self.data)
+        result["progress"] = round(self.fraction_done(), 3)
+        result["eta_seconds"] = self.eta_seconds()
+        return result
+
+
+def add_listener(listener: Callable[[JobRecord, Dict[str, Any]], None]):
+    """Registers `listener(job, fields)` to be called after every job update."""
+    _listeners.append(listener)
+
+
+def get_job(task_path: Path) -> Optional[JobRecord]:
+    """Returns the live record for a running job, or the persisted one."""
+    with _jobs_lock:
+        job = _jobs.get(str(task_path))
+    return job if job is not None else JobRecord.load(task_path)
+
+
+def pending_count() -> int:
+    with _jobs_lock:
+        return len(_jobs)
+
+
+def submit(task_path: Path, work: Callable[[JobRecord], None]) -> JobRecord:
+    """
+    Queues `work(job)` on the ingestion pool. The job is marked 'ready' when
+    it returns and 'failed' if it raises.
+    """
+    with _jobs_lock:
+        if len(_jobs) >= INGEST_MAX_PENDING:
+            raise QueueFullError("Too many ingestion jobs in progress. Please try again later.")
+        job = JobRecord.create(task_path)
+        _jobs[str(task_path)] = job
+
+    def run():
+        job.update(stage="starting", started_at=time.time())
+        try:
+            work(job)
+            job.update(status="ready", stage="done", finished_at=time.time())
+        except Exception as e:
+            print(f"Ingestion failed for {task_path.name}: {e}")
+            job.update(status="failed", stage="failed", error=str(e), finished_at=time.time())
+        finally:
+            with _jobs_lock:
+                _jobs.pop(str(task_path), None)
+
+    _executor.submit(run)
+    return job
+
+
+def recover(task_dir: Path):
+    """Marks jobs that were interrupted by a server restart as failed."""
+    if not task_dir.exists():
+        return
+    for task_path in task_dir.iterdir():
+        if not task_path.is_dir():
+            continue
+        job = JobRecord.load(task_path)
+        if job is not None and job.status == "processing":
+            job.update(status="failed", stage="failed", error="Interrupted by server restart.")
@@ -0,0 +1,88 @@
+import re
+import sqlite3
+from typing import List, Dict, Any
+from sqlite_mirror import SQLiteMirror
+
+# Hyphens and underscores are part of a term, so part numbers such as
+# "XJ-200" are indexed and matched whole.
+_TERM_RE = re.compile(r"[\w\-]+")
+
+
+def query_terms(text: str) -> List[str]:
+    return list(dict.fromkeys(t.strip("-").lower() for t in _TERM_RE.findall(text) if t.strip("-")))
+
+
+class BM25Index(SQLiteMirror):
+    """
+    Persistent per-task inverted index over chunk text, ranked with BM25.
+    Chunks are rows of a plain table, keyed by chunk id and indexed by
+    pdf_name so deletes find them directly, and an FTS5 table indexes their
+    text, kept in step by triggers.
+    """
+
+    KIND = "BM25 index"
+    CHUNKS_TABLE = "chunk_rows"
+    TABLES = ("chunk_text", "chunk_rows")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = super()._connect()
+        # Rows replaced by INSERT OR REPLACE also leave the FTS index.
+        conn.execute("PRAGMA recursive_triggers = ON")
+        return conn
+
+    def _create_tables(self, conn: sqlite3.Connection):
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'chunks'").fetchone():
+            # Indexes from before chunk_rows existed are rebuilt from the collection.
+            conn.execute("DROP TABLE chunks")
+            conn.execute("DELETE FROM meta WHERE key = 'version'")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunk_rows (id INTEGER PRIMARY KEY, chunk_id TEXT UNIQUE, "
+            "pdf_name TEXT, page_number INTEGER, text TEXT)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS chunk_rows_pdf_name ON chunk_rows (pdf_name)")
+        conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS chunk_text USING fts5("
+            "text, content = 'chunk_rows', content_rowid = 'id', "
+            "tokenize = \"unicode61 tokenchars '-_'\")"
+        )
+        conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS chunk_rows_insert AFTER INSERT ON chunk_rows BEGIN "
+            "INSERT INTO chunk_text (rowid, text) VALUES (new.id, new.text); END"
+        )
+        conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS chunk_rows_delete AFTER DELETE ON chunk_rows BEGIN "
+            "INSERT INTO chunk_text (chunk_text, rowid, text) VALUES ('delete', old.id, old.text); END"
+        )
+
+    def add(self, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]], **_):
+        rows = [
+            (chunk_id, metadata.get("pdf_name"), metadata.get("page_number"), document)
+            for chunk_id, document, metadata in zip(ids, documents, metadatas)
+        ]
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO chunk_rows (chunk_id, pdf_name, page_number, text) VALUES (?, ?, ?, ?)", rows
+            )
+        conn.close()
+
+    def search(self, query_text: str, n_results: int) -> List[Dict[str, Any]]:
+        """Returns the best BM25 matches for any of the query's terms, best first."""
+        terms = query_terms(query_text)
+        if not terms or not self.path.exists():
+            return []
+        match = " OR ".join('"' + term.replace('"', '""') + '"' for term in terms)
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT chunk_rows.chunk_id, chunk_rows.pdf_name, chunk_rows.page_number, chunk_rows.text, "
+                "bm25(chunk_text) FROM chunk_text JOIN chunk_rows ON chunk_rows.id = chunk_text.rowid "
+                "WHERE chunk_text MATCH ? ORDER BY chunk_text.rank LIMIT ?",
+                (match, n_results),
+            ).fetchall()
+        finally:
+            conn.close()
+        return [
+            # FTS5 reports BM25 negated so that smaller sorts first.
+            {"id": chunk_id, "pdf_name": pdf_name, "page_number": page_number, "text": text, "score": -score}
+            for chunk_id, pdf_name, page_number, text, score in rows
+        ]
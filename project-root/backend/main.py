@@ -2,30 +2,139 @@ import os
 import shutil
 import uvicorn
 from pathlib import Path
-from fastapi import FastAPI, UploadFile, HTTPException, Form, File
+from fastapi import FastAPI, UploadFile, HTTPException, Form, File, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, JSONResponse
-from typing import List, Dict, Any
-from pydantic import BaseModel
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from typing import Annotated, List, Dict, Any, Literal, Optional
+from pydantic import BaseModel, Field
 from datetime import datetime
+from email.utils import formatdate, parsedate_to_datetime
+from contextlib import asynccontextmanager
 import model
+import index_config
+import jobs
+import task_catalog
+import tts
+import upload_stream
+import page_render
+import metrics
+import profiling
+from embedding_cache import file_sha256
 import json
+import asyncio
+import threading
 import re
 import time
 import random
-import requests
+import httpx
 import base64
 import io
 import struct
+import hashlib
+from collections import defaultdict
 
 # Set the path to the 'task' directory relative to the project root.
 TASK_DIR = Path(os.getenv("TASK_DIR", Path(__file__).parent.parent / "task"))
 FRONTEND_BUILD_DIR = Path(os.getenv("FRONTEND_BUILD_DIR", Path(__file__).parent.parent / "frontend/dist"))
 
+# Load the embedding model in the background at startup instead of on the
+# first request that needs it.
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "true").lower() == "true"
+
 TASK_DIR.mkdir(parents=True, exist_ok=True)
 
-app = FastAPI()
+# Index of tasks served by /tasks, so listing them does not scan TASK_DIR.
+# It is kept on local disk by default, since TASK_DIR may be network
+# storage, where SQLite's WAL mode is not safe.
+TASK_CATALOG = task_catalog.TaskCatalog(Path(os.getenv(
+    "TASK_CATALOG_PATH", Path(__file__).parent.parent / "cache" / "task_catalog.sqlite3"
+)))
+
+# Size limits of streamed uploads, per file and per request.
+UPLOAD_MAX_FILE_MB = int(os.getenv("UPLOAD_MAX_FILE_MB", "200"))
+UPLOAD_MAX_TOTAL_MB = int(os.getenv("UPLOAD_MAX_TOTAL_MB", "1024"))
+
+# Opt-in sampling profiler: when enabled, a request sent with the header
+# "X-Profile: 1" is profiled and its stacks written to PROFILE_DIR; the
+# response's X-Profile header names the file.
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", Path(__file__).parent.parent / "cache" / "profiles"))
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+
+# Pages rendered by /pdfs/{task_name}/{filename}/pages/{page_number}.
+PAGE_CACHE = page_render.PageCache(
+    Path(os.getenv("PAGE_CACHE_DIR", Path(__file__).parent.parent / "cache" / "pages")),
+    max_bytes=int(os.getenv("PAGE_CACHE_MAX_MB", "256")) * 1024 * 1024,
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Done at startup rather than import time: parse workers are spawned
+    # processes that may re-import this module.
+    jobs.recover(TASK_DIR)
+    _sync_catalog()
+    if MODEL_WARMUP:
+        model.warm_up_model()
+    # Copy tasks indexed before the global index existed into it.
+    threading.Thread(target=model.sync_global_index, args=(TASK_DIR,), name="global-index-sync", daemon=True).start()
+    yield
+    if tts_client is not None:
+        await tts_client.aclose()
+
+app = FastAPI(lifespan=lifespan)
+
+
+class ObservabilityMiddleware:
+    """
+    Records each request's latency by route template in metrics, and
+    profiles requests that ask for it when PROFILING_ENABLED is set. Both
+    cover the time until the response headers are sent, which for streamed
+    responses is the time to the first byte.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        profiler = None
+        if PROFILING_ENABLED and (b"x-profile", b"1") in scope["headers"]:
+            profiler = profiling.SamplingProfiler(PROFILE_INTERVAL)
+            profiler.start()
+        start = time.perf_counter()
+        started = False
+
+        async def finish(status: int) -> Optional[str]:
+            route = getattr(scope.get("route"), "path", "unmatched")
+            metrics.HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - start, method=scope["method"], route=route, status=str(status)
+            )
+            if profiler is None:
+                return None
+            profiler.stop()
+            profile_file = profiling.profile_path(PROFILE_DIR, scope["method"], scope["path"])
+            await run_in_threadpool(profiler.write, profile_file)
+            return profile_file.name
+
+        async def send_observed(message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+                profile_name = await finish(message["status"])
+                if profile_name is not None:
+                    message["headers"] = list(message.get("headers", [])) + [(b"x-profile", profile_name.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_observed)
+        finally:
+            if not started:
+                # The app raised before starting a response.
+                await finish(500)
 
 origins = [
     "http://localhost:5173",
@@ -40,11 +149,32 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Total-Count", "X-Profile"],
 )
+app.add_middleware(ObservabilityMiddleware)
 
 class RecommendationRequest(BaseModel):
     task_name: str
     query_text: str
+    n_results: int = Field(5, ge=1, le=50)
+    # Ask for all reasons in a single LLM call; defaults to LLM_BATCH_REASONS.
+    batch_reasons: Optional[bool] = None
+    # Ranking to use; defaults to SEARCH_MODE.
+    mode: Optional[Literal["vector", "lexical", "hybrid"]] = None
+
+class BatchRecommendationRequest(BaseModel):
+    task_name: str
+    query_texts: List[str] = Field(..., min_length=1, max_length=64)
+    n_results: int = Field(5, ge=1, le=50)
+    # Refine reasons with the LLM (one batched call per query).
+    refine_reasons: bool = False
+    mode: Optional[Literal["vector", "lexical", "hybrid"]] = None
+
+class GlobalSearchRequest(BaseModel):
+    query_text: str
+    n_results: int = Field(10, ge=1, le=50)
+    # Restrict the search to these tasks; all tasks when omitted.
+    task_names: Optional[List[str]] = None
 
 class InsightsRequest(BaseModel):
     query_text: str
@@ -60,16 +190,42 @@ class PodcastRequest(BaseModel):
 class GenerateAudioRequest(BaseModel):
     script: str
     voice_name: str = "en-US-JennyNeural"
+    # Synthesize sentence-bounded segments in parallel; defaults to on for
+    # scripts longer than TTS_SEGMENT_CHARS.
+    segmented: Optional[bool] = None
+
+class IndexSettings(BaseModel):
+    # Distance metric and HNSW graph settings; fixed once the task is indexed.
+    space: Optional[Literal["l2", "cosine", "ip"]] = None
+    hnsw_m: Optional[int] = Field(None, ge=2, le=128)
+    ef_construction: Optional[int] = Field(None, ge=1, le=4096)
+    # Search settings, which can change at any time.
+    ef_search: Optional[int] = Field(None, ge=1, le=4096)
+    quantization: Optional[Literal["none", "int8"]] = None
+    rerank_factor: Optional[int] = Field(None, ge=1, le=100)
 
 # --- LLM and TTS Configuration (now primarily via environment variables) ---
 LLM_PROVIDER = os.getenv("LLM_PROVIDER")
 if not LLM_PROVIDER:
     print("Warning: LLM_PROVIDER environment variable not set. LLM functionality may be limited.")
 
+# Largest size a WAV header can declare; used when the length is not known yet.
+STREAMING_DATA_SIZE = 0xFFFFFFFF
+
+# Maximum LLM calls in flight across all requests, and the per-call timeout.
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "4"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "20"))
+LLM_BATCH_REASONS = os.getenv("LLM_BATCH_REASONS", "false").lower() == "true"
+GENERIC_REASON = "This section is relevant as it contains information related to the query's topic."
+
+_llm_semaphore = asyncio.Semaphore(LLM_CONCURRENCY)
+
 TTS_PROVIDER = os.getenv("TTS_PROVIDER")
 AZURE_TTS_KEY = os.getenv("AZURE_TTS_KEY")
 AZURE_TTS_REGION = os.getenv("AZURE_TTS_REGION", "centralindia")
 AZURE_TTS_ENDPOINT_ENV = os.getenv("AZURE_TTS_ENDPOINT")
+AZURE_TTS_SPEECH_ENDPOINT_ENV = os.getenv("AZURE_TTS_SPEECH_ENDPOINT")
+AZURE_TTS_TOKEN_TTL = float(os.getenv("AZURE_TTS_TOKEN_TTL", "540"))
 
 AZURE_TTS_TOKEN_ENDPOINT = None
 AZURE_TTS_SPEECH_ENDPOINT = None
@@ -78,18 +234,35 @@ if TTS_PROVIDER == "azure":
         print("Error: AZURE_TTS_KEY not found for Azure TTS. TTS functionality will be disabled.")
     else:
         AZURE_TTS_TOKEN_ENDPOINT = AZURE_TTS_ENDPOINT_ENV if AZURE_TTS_ENDPOINT_ENV else f"https://{AZURE_TTS_REGION}.api.cognitive.microsoft.com/sts/v1.0/issueToken"
-        AZURE_TTS_SPEECH_ENDPOINT = f"https://{AZURE_TTS_REGION}.tts.speech.microsoft.com/cognitiveservices/v1"
+        AZURE_TTS_SPEECH_ENDPOINT = AZURE_TTS_SPEECH_ENDPOINT_ENV if AZURE_TTS_SPEECH_ENDPOINT_ENV else f"https://{AZURE_TTS_REGION}.tts.speech.microsoft.com/cognitiveservices/v1"
 else:
     print(f"TTS_PROVIDER is not 'azure' (current: {TTS_PROVIDER}). Azure TTS will be disabled.")
 
+# Long scripts are split into segments of about this many characters,
+# synthesized TTS_CONCURRENCY at a time and cached on disk by text.
+TTS_SEGMENT_CHARS = int(os.getenv("TTS_SEGMENT_CHARS", "1000"))
+TTS_CONCURRENCY = int(os.getenv("TTS_CONCURRENCY", "4"))
+TTS_SEGMENT_RETRIES = int(os.getenv("TTS_SEGMENT_RETRIES", "2"))
+TTS_SEGMENT_CACHE = tts.SegmentCache(
+    Path(os.getenv("TTS_CACHE_DIR", Path(__file__).parent.parent / "cache" / "tts")),
+    max_bytes=int(os.getenv("TTS_CACHE_MAX_MB", "256")) * 1024 * 1024,
+)
 
-def pcm_to_wav(pcm_data: bytes, sample_rate: int = 16000, channels: int = 1, bit_depth: int = 16) -> bytes:
-    """Converts raw PCM audio data to WAV format."""
+tts_client = None
+if AZURE_TTS_KEY and AZURE_TTS_TOKEN_ENDPOINT and AZURE_TTS_SPEECH_ENDPOINT:
+    tts_client = tts.AzureTTSClient(AZURE_TTS_KEY, AZURE_TTS_TOKEN_ENDPOINT, AZURE_TTS_SPEECH_ENDPOINT, token_ttl=AZURE_TTS_TOKEN_TTL)
+
+
+def wav_header(data_size: int, sample_rate: int = 16000, channels: int = 1, bit_depth: int = 16) -> bytes:
+    """
+    Builds a 44-byte PCM WAV header. For streams of unknown length pass
+    STREAMING_DATA_SIZE; players then read until the connection closes.
+    """
     byte_depth = bit_depth // 8
-    data_size = len(pcm_data)
-    
+    riff_size = min(36 + data_size, STREAMING_DATA_SIZE)
+
     wav_header = b'RIFF'
-    wav_header += struct.pack('<I', 36 + data_size)
+    wav_header += struct.pack('<I', riff_size)
     wav_header += b'WAVE'
     
     wav_header += b'fmt '
@@ -103,16 +276,157 @@ def pcm_to_wav(pcm_data: bytes, sample_rate: int = 16000, channels: int = 1, bit
     
     wav_header += b'data'
     wav_header += struct.pack('<I', data_size)
-    wav_header += pcm_data
     
     return wav_header
 
 
+def pcm_to_wav(pcm_data: bytes, sample_rate: int = 16000, channels: int = 1, bit_depth: int = 16) -> bytes:
+    """Converts raw PCM audio data to WAV format."""
+    return wav_header(len(pcm_data), sample_rate, channels, bit_depth) + pcm_data
+
+
+def _tts_segments(request_body: GenerateAudioRequest) -> Optional[List[str]]:
+    """Returns the script's segments when it should be synthesized in parts."""
+    segmented = request_body.segmented
+    if segmented is None:
+        segmented = len(request_body.script) > TTS_SEGMENT_CHARS
+    if not segmented:
+        return None
+    return tts.split_script(request_body.script, TTS_SEGMENT_CHARS)
+
+
+def _synthesize_segments(segments: List[str], voice_name: str):
+    return tts_client.synthesize_segments(
+        segments,
+        voice_name,
+        concurrency=TTS_CONCURRENCY,
+        retries=TTS_SEGMENT_RETRIES,
+        cache=TTS_SEGMENT_CACHE,
+    )
+
+
+def _ingest_task(task_name: str, task_path: Path, job: jobs.JobRecord):
+    """
+    Embeds the bulk PDFs waiting in temp_bulk, then moves them into the task's
+    bulk folder. Chunks of any earlier version of the same files are removed
+    first, so this serves both new tasks and incremental updates.
+    """
+    temp_bulk_dir = task_path / "temp_bulk"
+    bulk_dir = task_path / "bulk"
+    manifest = model.load_manifest(task_path)
+
+    for file in os.listdir(temp_bulk_dir):
+        if file in manifest or (bulk_dir / file).exists():
+            model.delete_documents(task_name, task_path, file, manifest.pop(file, {}).get("chunks"))
+
+    manifest.update(model.embed_documents(task_name, temp_bulk_dir, task_path, progress=job.update))
+    model.save_manifest(task_path, manifest)
+
+    job.update(stage="finalizing")
+    for file in os.listdir(temp_bulk_dir):
+        shutil.move(temp_bulk_dir / file, bulk_dir / file)
+    shutil.rmtree(temp_bulk_dir)
+
+
+def _ingest_upload(task_name: str, task_path: Path, pdfs: upload_stream.PdfQueue, job: jobs.JobRecord):
+    """Embeds the bulk PDFs of a streamed upload as each one arrives."""
+    manifest = model.embed_documents(task_name, task_path / "bulk", task_path, progress=job.update, pdf_stream=pdfs)
+    model.save_manifest(task_path, manifest)
+
+
+def _new_index_config(index_settings: IndexSettings) -> Dict[str, Any]:
+    return {**index_config.DEFAULT_CONFIG, **index_settings.model_dump(exclude_none=True)}
+
+
+def _existing_task_path(task_name: str) -> Path:
+    task_path = TASK_DIR / Path(task_name).name
+    if not task_path.is_dir():
+        raise HTTPException(status_code=404, detail="Task not found.")
+    return task_path
+
+
+# Held by requests that change an existing task's bulk PDFs, from their
+# status check until their manifest is saved or their job is submitted, so a
+# delete and an upload cannot interleave.
+_task_edit_locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+
+def _task_status(task_path: Path) -> str:
+    job = jobs.get_job(task_path)
+    if job is not None:
+        return job.status
+    # Tasks created before job records existed only have status.txt.
+    status_file = task_path / 'status.txt'
+    return status_file.read_text().strip() if status_file.exists() else 'processing'
+
+
+def _dir_size(path: Path) -> int:
+    if path.is_file():
+        return path.stat().st_size
+    size = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                size += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return size
+
+
+def _describe_task(task_path: Path) -> Dict[str, Any]:
+    """Reads a task's catalog entry from its directory."""
+    bulk_files = os.listdir(task_path / "bulk") if (task_path / "bulk").is_dir() else []
+    fresh_files = os.listdir(task_path / "fresh") if (task_path / "fresh").is_dir() else []
+    created_at_file = task_path / 'created_at.txt'
+    job = jobs.get_job(task_path)
+    manifest = model.load_manifest(task_path)
+    return {
+        "status": _task_status(task_path),
+        "stage": job.data.get("stage") if job else None,
+        "error": job.data.get("error") if job else None,
+        "created_at": created_at_file.read_text().strip() if created_at_file.exists() else None,
+        "bulk_files": bulk_files,
+        "fresh_files": fresh_files,
+        "pdf_count": len(bulk_files),
+        "chunk_count": sum(entry.get("chunks", 0) for entry in manifest.values()),
+        "index_bytes": _dir_size(task_path / "chroma") + _dir_size(task_path / model.LEXICAL_INDEX_FILE),
+    }
+
+
+def _refresh_catalog(task_path: Path):
+    TASK_CATALOG.upsert(task_path.name, **_describe_task(task_path))
+
+
+def _on_job_update(job: jobs.JobRecord, fields: Dict[str, Any]):
+    if fields.get("status") in ("ready", "failed"):
+        _refresh_catalog(job.task_path)
+    elif "stage" in fields or "status" in fields:
+        TASK_CATALOG.upsert(job.task_path.name, status=job.status, stage=job.data.get("stage"))
+
+jobs.add_listener(_on_job_update)
+
+
+def _sync_catalog():
+    """
+    Adds tasks missing from the catalog (such as tasks created before it
+    existed) and drops entries whose directory is gone. Runs at startup.
+    """
+    on_disk = {entry.name for entry in os.scandir(TASK_DIR) if entry.is_dir()}
+    cataloged = set(TASK_CATALOG.names())
+    for task_name in cataloged - on_disk:
+        TASK_CATALOG.delete(task_name)
+    for task_name in sorted(on_disk - cataloged):
+        _refresh_catalog(TASK_DIR / task_name)
+
+
 @app.post("/upload_task")
-async def upload_task(task_name: str = Form(...), bulk_files: List[UploadFile] = File(...), fresh_file: UploadFile = File(...)):
+async def upload_task(index_settings: Annotated[IndexSettings, Query()], task_name: str = Form(...),
+                      bulk_files: List[UploadFile] = File(...), fresh_file: UploadFile = File(...)):
     """
     Handles the upload of bulk and fresh PDF files and saves them
-    to a directory named by the user.
+    to a directory named by the user. Embedding runs in the background;
+    poll /tasks/{task_name}/progress for its state. Index settings given as
+    query parameters override the defaults in index_config.py.
     """
     try:
         sanitized_task_name = Path(task_name).name
@@ -123,6 +437,9 @@ async def upload_task(task_name: str = Form(...), bulk_files: List[UploadFile] =
         
         if task_path.exists() and task_path.is_dir():
             raise HTTPException(status_code=400, detail=f"Task '{sanitized_task_name}' already exists. Please choose a different name.")
+
+        if jobs.pending_count() >= jobs.INGEST_MAX_PENDING:
+            raise HTTPException(status_code=503, detail="Too many uploads are being processed. Please try again later.")
             
         bulk_dir = task_path / "bulk"
         fresh_dir = task_path / "fresh"
@@ -131,6 +448,7 @@ async def upload_task(task_name: str = Form(...), bulk_files: List[UploadFile] =
 
         temp_bulk_dir = task_path / "temp_bulk"
         temp_bulk_dir.mkdir(parents=True, exist_ok=True)
+        index_config.save(task_path, _new_index_config(index_settings))
         
         fresh_file_path = fresh_dir / fresh_file.filename
         with open(fresh_file_path, "wb") as buffer:
@@ -141,49 +459,184 @@ async def upload_task(task_name: str = Form(...), bulk_files: List[UploadFile] =
             with open(bulk_file_path, "wb") as buffer:
                 shutil.copyfileobj(file.file, buffer)
         
-        (task_path / 'status.txt').write_text('processing')
         (task_path / 'created_at.txt').write_text(datetime.now().isoformat())
         
-        model.embed_documents(sanitized_task_name, temp_bulk_dir, task_path)
-        
-        for file in os.listdir(temp_bulk_dir):
-            shutil.move(temp_bulk_dir / file, bulk_dir / file)
-        shutil.rmtree(temp_bulk_dir)
-        
-        (task_path / 'status.txt').write_text('ready')
-                
-        return {"status": "success", "task_name": sanitized_task_name}
+        jobs.submit(task_path, lambda job: _ingest_task(sanitized_task_name, task_path, job))
+        _refresh_catalog(task_path)
+
+        return {"status": "processing", "task_name": sanitized_task_name}
+    except HTTPException:
+        raise
+    except jobs.QueueFullError as e:
+        # Without a job the task would show as processing forever.
+        shutil.rmtree(task_path, ignore_errors=True)
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"File upload failed: {str(e)}")
 
+@app.post("/upload_task/{task_name}")
+async def upload_task_stream(task_name: str, request: Request, index_settings: Annotated[IndexSettings, Query()]):
+    """
+    Streaming version of /upload_task, taking the same bulk_files and
+    fresh_file parts with the task name in the path. Files are written
+    straight into the task and hashed as they arrive, and each bulk PDF is
+    embedded as soon as it is complete, so ingestion overlaps the upload.
+    Files over UPLOAD_MAX_FILE_MB, or uploads over UPLOAD_MAX_TOTAL_MB in
+    total, are rejected with 413 and the task is marked failed. Index
+    settings are taken from the query string, as for /upload_task.
+    """
+    sanitized_task_name = Path(task_name).name
+    if not sanitized_task_name:
+        raise HTTPException(status_code=400, detail="Invalid task name.")
+
+    task_path = TASK_DIR / sanitized_task_name
+    if task_path.exists() and task_path.is_dir():
+        raise HTTPException(status_code=400, detail=f"Task '{sanitized_task_name}' already exists. Please choose a different name.")
+
+    if jobs.pending_count() >= jobs.INGEST_MAX_PENDING:
+        raise HTTPException(status_code=503, detail="Too many uploads are being processed. Please try again later.")
+
+    bulk_dir = task_path / "bulk"
+    fresh_dir = task_path / "fresh"
+    bulk_dir.mkdir(parents=True, exist_ok=True)
+    fresh_dir.mkdir(parents=True, exist_ok=True)
+    (task_path / 'created_at.txt').write_text(datetime.now().isoformat())
+    index_config.save(task_path, _new_index_config(index_settings))
+
+    def destination(field_name: str, filename: str) -> Path:
+        filename = Path(filename).name
+        if not filename:
+            raise upload_stream.UploadError(400, "Invalid file name.")
+        if field_name == "bulk_files":
+            return bulk_dir / filename
+        if field_name == "fresh_file":
+            if any(fresh_dir.iterdir()):
+                raise upload_stream.UploadError(400, "Only one fresh_file may be uploaded.")
+            return fresh_dir / filename
+        raise upload_stream.UploadError(400, f"Unexpected file field '{field_name}'.")
+
+    pdfs = upload_stream.PdfQueue()
+    def on_file(field_name: str, path: Path, sha256: str):
+        if field_name == "bulk_files" and path.name.lower().endswith(".pdf"):
+            pdfs.put(path, sha256)
+
+    try:
+        jobs.submit(task_path, lambda job: _ingest_upload(sanitized_task_name, task_path, pdfs, job))
+    except jobs.QueueFullError as e:
+        shutil.rmtree(task_path, ignore_errors=True)
+        raise HTTPException(status_code=503, detail=str(e))
+    _refresh_catalog(task_path)
+
+    # The ingestion job waits on `pdfs` until it is closed, however the
+    # request ends (including the client disconnecting).
+    error: Optional[Exception] = RuntimeError("Upload was interrupted.")
+    try:
+        await upload_stream.receive_files(
+            request,
+            destination,
+            on_file,
+            max_file_bytes=UPLOAD_MAX_FILE_MB * 1024 * 1024,
+            max_total_bytes=UPLOAD_MAX_TOTAL_MB * 1024 * 1024,
+        )
+        if not any(bulk_dir.iterdir()) or not any(fresh_dir.iterdir()):
+            raise upload_stream.UploadError(400, "Both bulk_files and a fresh_file are required.")
+        error = None
+    except upload_stream.UploadError as e:
+        error = e
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except Exception as e:
+        error = e
+        raise HTTPException(status_code=500, detail=f"File upload failed: {str(e)}")
+    finally:
+        pdfs.close(error)
+
+    return {"status": "processing", "task_name": sanitized_task_name}
+
+async def _llm_call(messages: List[Dict[str, str]]) -> str:
+    """Runs a blocking LLM call off the event loop, bounded by LLM_CONCURRENCY and LLM_TIMEOUT."""
+    await _llm_semaphore.acquire()
+    try:
+        future = asyncio.get_running_loop().run_in_executor(None, model.get_llm_response, messages, LLM_TIMEOUT)
+    except BaseException:
+        _llm_semaphore.release()
+        raise
+    # The thread cannot be stopped, so its slot is freed when it finishes
+    # rather than when the wait below times out or is cancelled.
+    future.add_done_callback(lambda _: _llm_semaphore.release())
+    return await asyncio.wait_for(asyncio.shield(future), timeout=LLM_TIMEOUT)
+
+
+async def _refine_reason(query_text: str, rec: Dict[str, Any]) -> str:
+    messages = [
+        {"role": "user", "content": f"""
+        You are an AI assistant that provides a specific reason for a document's relevance to a query.
+        The original query is: "{query_text}"
+        The relevant document section is: "{rec['section']}"
+        Please provide a one-sentence, specific reason why this document section is relevant to the query.
+        The reason must be unique and different for every recommendation.
+        """}
+    ]
+    try:
+        return await _llm_call(messages)
+    except Exception as e:
+        print(f"Error calling LLM for refinement: {e!r}. Falling back to generic reason.")
+        return GENERIC_REASON
+
+
+async def _refine_reasons_batched(query_text: str, recs: List[Dict[str, Any]]) -> List[str]:
+    """Asks for every recommendation's reason in one structured LLM call."""
+    sections = "\n".join(f'{i}. "{rec["section"]}"' for i, rec in enumerate(recs, start=1))
+    messages = [
+        {"role": "user", "content": f"""
+        You are an AI assistant that explains why document sections are relevant to a query.
+        The original query is: "{query_text}"
+        The relevant document sections are:
+        {sections}
+        For each section, write a one-sentence, specific reason why it is relevant to the query.
+        Every reason must be unique.
+        Respond with only a JSON array with exactly {len(recs)} strings, in the same order as the sections.
+        """}
+    ]
+    try:
+        raw_text_response = await _llm_call(messages)
+        json_match = re.search(r"\[.*\]", raw_text_response, re.DOTALL)
+        reasons = json.loads(json_match.group(0)) if json_match else []
+    except Exception as e:
+        print(f"Error calling LLM for batched refinement: {e!r}. Falling back to generic reasons.")
+        reasons = []
+
+    if not isinstance(reasons, list):
+        reasons = []
+    return [
+        reasons[i] if i < len(reasons) and isinstance(reasons[i], str) and reasons[i].strip() else GENERIC_REASON
+        for i in range(len(recs))
+    ]
+
+
 @app.post("/get_recommendations")
 async def get_recommendations_endpoint(request_body: RecommendationRequest):
     """
     Takes selected text, runs the semantic search, and refines the output with Gemini.
+    Reasons are refined concurrently, or in one call when batch_reasons is set.
     """
     try:
         task_path = TASK_DIR / request_body.task_name
+        query_text = model.normalize_query(request_body.query_text)
         
-        raw_recommendations = model.get_recommendations(request_body.task_name, request_body.query_text, task_path)
-        
-        final_recommendations = []
-        for rec in raw_recommendations:
-            # Use model.py's get_llm_response for refinement
-            messages = [
-                {"role": "user", "content": f"""
-                You are an AI assistant that provides a specific reason for a document's relevance to a query.
-                The original query is: "{request_body.query_text}"
-                The relevant document section is: "{rec['section']}"
-                Please provide a one-sentence, specific reason why this document section is relevant to the query.
-                The reason must be unique and different for every recommendation.
-                """}
-            ]
-            try:
-                curated_reason = model.get_llm_response(messages)
-            except Exception as e:
-                print(f"Error calling LLM for refinement: {e}. Falling back to generic reason.")
-                curated_reason = "This section is relevant as it contains information related to the query's topic."
+        raw_recommendations = await run_in_threadpool(model.get_recommendations, request_body.task_name, query_text, task_path, request_body.n_results, request_body.mode)
 
+        batch_reasons = LLM_BATCH_REASONS if request_body.batch_reasons is None else request_body.batch_reasons
+        if not raw_recommendations:
+            reasons = []
+        elif batch_reasons:
+            reasons = await _refine_reasons_batched(query_text, raw_recommendations)
+        else:
+            reasons = await asyncio.gather(*(
+                _refine_reason(query_text, rec) for rec in raw_recommendations
+            ))
+
+        final_recommendations = []
+        for rec, curated_reason in zip(raw_recommendations, reasons):
             final_recommendations.append({
                 "pdf_name": rec['pdf_name'],
                 "page_number": rec['page_number'],
@@ -201,6 +654,57 @@ async def get_recommendations_endpoint(request_body: RecommendationRequest):
         raise HTTPException(status_code=500, detail=f"Recommendation retrieval failed: {str(e)}")
 
 
+@app.post("/get_recommendations/batch")
+async def get_recommendations_batch_endpoint(request_body: BatchRecommendationRequest):
+    """
+    Recommendations for several selected passages at once. All queries are
+    embedded in one pass and searched with a single vector query.
+    """
+    try:
+        task_path = TASK_DIR / request_body.task_name
+        query_texts = [model.normalize_query(q) for q in request_body.query_texts]
+
+        all_recommendations = await run_in_threadpool(
+            model.get_recommendations_batch, request_body.task_name, query_texts, task_path, request_body.n_results,
+            request_body.mode,
+        )
+
+        if request_body.refine_reasons:
+            all_reasons = await asyncio.gather(*(
+                _refine_reasons_batched(query_text, recs) if recs else asyncio.sleep(0, result=[])
+                for query_text, recs in zip(query_texts, all_recommendations)
+            ))
+            for recs, reasons in zip(all_recommendations, all_reasons):
+                for rec, reason in zip(recs, reasons):
+                    rec["reason"] = reason
+
+        results = [
+            {"query_text": query_text, "recommendations": recs}
+            for query_text, recs in zip(query_texts, all_recommendations)
+        ]
+        return JSONResponse(content={"results": results})
+    except Exception as e:
+        print(f"Error generating batch recommendations: {e}")
+        raise HTTPException(status_code=500, detail=f"Recommendation retrieval failed: {str(e)}")
+
+
+@app.post("/search")
+async def search_all_tasks_endpoint(request_body: GlobalSearchRequest):
+    """
+    Searches the documents of every task (or of `task_names`) at once and
+    returns the overall best matches with their task, PDF and page.
+    """
+    if not request_body.query_text.strip():
+        raise HTTPException(status_code=400, detail="Query text cannot be empty.")
+    try:
+        results = await run_in_threadpool(
+            model.search_all_tasks, request_body.query_text, request_body.n_results, request_body.task_names
+        )
+        return {"query_text": request_body.query_text, "results": results}
+    except Exception as e:
+        print(f"Error in search_all_tasks: {e}")
+        raise HTTPException(status_code=500, detail=f"An internal server error occurred: {str(e)}")
+
 @app.post("/get_insights")
 async def get_insights_endpoint(request_body: InsightsRequest):
     """
@@ -214,7 +718,7 @@ async def get_insights_endpoint(request_body: InsightsRequest):
         insights_prompt = f"""
         Based on the user's selected text and the provided recommendations, generate interesting insights, facts, and "Did You Know?" points.
         
-        User's selected text: "{request_body.query_text}"
+        User's selected text: "{model.normalize_query(request_body.query_text)}"
         Recommendations: {json.dumps(request_body.recommendations, indent=2)}
 
         Provide your response as a JSON object with two keys: "facts" and "didYouKnows". Each key should be a list of strings.
@@ -278,7 +782,7 @@ async def get_podcast_script_endpoint(request_body: PodcastRequest):
         Avoid explicit opening phrases like "Welcome to the show" or closing phrases like "That's all for today."
         Instead, make it flow like a real, continuous monologue.
 
-        User's selected text: "{request_body.query_text}"
+        User's selected text: "{model.normalize_query(request_body.query_text)}"
         Recommendations: {json.dumps(request_body.recommendations, indent=2)}
         Insights: {json.dumps(request_body.insights, indent=2)}
         """
@@ -302,45 +806,23 @@ async def generate_podcast_audio_endpoint(request_body: GenerateAudioRequest):
     """
     Converts a given script to audio using Azure TTS and returns base64 encoded WAV.
     """
-    if not AZURE_TTS_KEY or not AZURE_TTS_TOKEN_ENDPOINT or not AZURE_TTS_SPEECH_ENDPOINT:
+    if tts_client is None:
         raise HTTPException(status_code=500, detail="Azure TTS API configuration missing or incomplete.")
 
     try:
-        token_headers = {
-            'Ocp-Apim-Subscription-Key': AZURE_TTS_KEY
-        }
-        token_response = requests.post(AZURE_TTS_TOKEN_ENDPOINT, headers=token_headers)
-        token_response.raise_for_status()
-        access_token = token_response.text
-
-        speech_headers = {
-            'Authorization': 'Bearer ' + access_token,
-            'Content-Type': 'application/ssml+xml',
-            'X-Microsoft-OutputFormat': 'riff-16khz-16bit-mono-pcm',
-            'User-Agent': 'FastAPIApp'
-        }
-        ssml_body = f"""
-        <speak version='1.0' xml:lang='en-US'>
-            <voice name='{request_body.voice_name}'>
-                {request_body.script}
-            </voice>
-        </speak>
-        """
-        
-        speech_response = requests.post(
-            AZURE_TTS_SPEECH_ENDPOINT,
-            headers=speech_headers,
-            data=ssml_body.encode('utf-8')
-        )
-        speech_response.raise_for_status()
+        segments = _tts_segments(request_body)
+        if segments is None:
+            pcm_data = await tts_client.synthesize(request_body.script, request_body.voice_name)
+        else:
+            pcm_data = b"".join([pcm async for pcm in _synthesize_segments(segments, request_body.voice_name)])
 
-        wav_data = pcm_to_wav(speech_response.content, sample_rate=16000, channels=1, bit_depth=16)
+        wav_data = pcm_to_wav(pcm_data, sample_rate=tts.SAMPLE_RATE, channels=1, bit_depth=16)
         
         audio_base64 = base64.b64encode(wav_data).decode('utf-8')
 
         return JSONResponse(content={"audio_base64": audio_base64, "mime_type": "audio/wav"})
 
-    except requests.exceptions.RequestException as e:
+    except (tts.TTSError, httpx.HTTPError) as e:
         print(f"Azure TTS API request failed: {e}")
         raise HTTPException(status_code=500, detail=f"Azure TTS API request failed: {str(e)}")
     except Exception as e:
@@ -348,47 +830,292 @@ async def generate_podcast_audio_endpoint(request_body: GenerateAudioRequest):
         raise HTTPException(status_code=500, detail=f"Podcast audio generation failed: {str(e)}")
 
 
+@app.post("/generate_podcast_audio/stream")
+async def stream_podcast_audio_endpoint(request_body: GenerateAudioRequest):
+    """
+    Streams the script's audio as WAV: the header is sent immediately and PCM
+    follows in chunks as Azure produces it, without buffering the whole clip.
+    Segmented scripts are sent segment by segment in order.
+    """
+    if tts_client is None:
+        raise HTTPException(status_code=500, detail="Azure TTS API configuration missing or incomplete.")
+
+    segments = _tts_segments(request_body)
+    if segments is not None:
+        pcm_segments = _synthesize_segments(segments, request_body.voice_name)
+        try:
+            # Wait for the first segment so failures still surface as an error status.
+            first = await pcm_segments.__anext__() if segments else b""
+        except (tts.TTSError, httpx.HTTPError) as e:
+            print(f"Azure TTS API request failed: {e}")
+            raise HTTPException(status_code=500, detail=f"Azure TTS API request failed: {str(e)}")
+
+        async def segmented_wav_stream():
+            yield wav_header(STREAMING_DATA_SIZE, sample_rate=tts.SAMPLE_RATE, channels=1, bit_depth=16)
+            try:
+                yield first
+                async for pcm in pcm_segments:
+                    yield pcm
+            finally:
+                await pcm_segments.aclose()
+
+        return StreamingResponse(segmented_wav_stream(), media_type="audio/wav")
+
+    try:
+        response = await tts_client.open_stream(request_body.script, request_body.voice_name)
+    except (tts.TTSError, httpx.HTTPError) as e:
+        print(f"Azure TTS API request failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Azure TTS API request failed: {str(e)}")
+
+    async def wav_stream():
+        yield wav_header(STREAMING_DATA_SIZE, sample_rate=tts.SAMPLE_RATE, channels=1, bit_depth=16)
+        async for chunk in tts_client.stream_pcm(response):
+            yield chunk
+
+    return StreamingResponse(wav_stream(), media_type="audio/wav")
+
+
 @app.get("/tasks")
-async def get_tasks():
-    """Returns a list of all created tasks."""
-    tasks = []
-    if not TASK_DIR.exists():
-        return []
-
-    for task_name in os.listdir(TASK_DIR):
-        task_path = TASK_DIR / task_name
-        if task_path.is_dir():
-            bulk_files = os.listdir(task_path / "bulk") if (task_path / "bulk").is_dir() else []
-            fresh_files = os.listdir(task_path / "fresh") if (task_path / "fresh").is_dir() else []
-            
-            status_file = task_path / 'status.txt'
-            status = status_file.read_text().strip() if status_file.exists() else 'processing'
-            
-            created_at_file = task_path / 'created_at.txt'
-            created_at = created_at_file.read_text().strip() if created_at_file.exists() else None
-            
-            tasks.append({
-                "task_name": task_name,
-                "bulk_files": bulk_files,
-                "fresh_files": fresh_files,
-                "status": status,
-                "created_at": created_at
-            })
-    return tasks
+async def get_tasks(
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    status: Optional[str] = None,
+    q: Optional[str] = None,
+):
+    """
+    Returns the created tasks, newest first, from the task catalog. `limit`
+    and `offset` page through them, `status` and `q` (a substring of the
+    task name) filter them; X-Total-Count gives the number of matches.
+    """
+    tasks, total = await run_in_threadpool(TASK_CATALOG.list, status, q, limit, offset)
+    return JSONResponse(content=tasks, headers={"X-Total-Count": str(total)})
 
-@app.get("/pdfs/{task_name}/{filename}")
-async def get_pdf(task_name: str, filename: str):
-    pdf_path_fresh = TASK_DIR / task_name / "fresh" / filename
-    pdf_path_bulk = TASK_DIR / task_name / "bulk" / filename
-    
-    if pdf_path_fresh.exists() and pdf_path_fresh.is_file():
-        return FileResponse(pdf_path_fresh, media_type="application/pdf")
-    
-    if pdf_path_bulk.exists() and pdf_path_bulk.is_file():
-        return FileResponse(pdf_path_bulk, media_type="application/pdf")
-        
+@app.get("/tasks/{task_name}/progress")
+async def get_task_progress(task_name: str):
+    """Reports ingestion progress: PDFs parsed, chunks embedded and an ETA."""
+    task_path = _existing_task_path(task_name)
+
+    job = jobs.get_job(task_path)
+    if job is None:
+        return {"task_name": task_path.name, "status": _task_status(task_path)}
+    return job.to_dict()
+
+@app.post("/tasks/{task_name}/bulk")
+async def add_bulk_files(task_name: str, bulk_files: List[UploadFile] = File(...)):
+    """
+    Adds bulk PDFs to an existing task. Files identical to ones already in the
+    task are skipped; new or changed files are embedded in the background.
+    """
+    try:
+        task_path = _existing_task_path(task_name)
+        async with _task_edit_locks[task_path.name]:
+            if _task_status(task_path) == 'processing':
+                raise HTTPException(status_code=409, detail=f"Task '{task_path.name}' is still being processed.")
+            if jobs.pending_count() >= jobs.INGEST_MAX_PENDING:
+                raise HTTPException(status_code=503, detail="Too many uploads are being processed. Please try again later.")
+
+            manifest = model.load_manifest(task_path)
+            temp_bulk_dir = task_path / "temp_bulk"
+            temp_bulk_dir.mkdir(parents=True, exist_ok=True)
+
+            added, replaced, unchanged = [], [], []
+            for file in bulk_files:
+                filename = Path(file.filename).name
+                bulk_file_path = temp_bulk_dir / filename
+                with open(bulk_file_path, "wb") as buffer:
+                    shutil.copyfileobj(file.file, buffer)
+
+                if manifest.get(filename, {}).get("sha256") == file_sha256(bulk_file_path):
+                    bulk_file_path.unlink()
+                    unchanged.append(filename)
+                elif (task_path / "bulk" / filename).exists():
+                    replaced.append(filename)
+                else:
+                    added.append(filename)
+
+            if not added and not replaced:
+                shutil.rmtree(temp_bulk_dir)
+                return {"status": "unchanged", "task_name": task_path.name, "unchanged": unchanged}
+
+            jobs.submit(task_path, lambda job: _ingest_task(task_path.name, task_path, job))
+            _refresh_catalog(task_path)
+
+            return {"status": "processing", "task_name": task_path.name, "added": added, "replaced": replaced, "unchanged": unchanged}
+    except HTTPException:
+        raise
+    except jobs.QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"File upload failed: {str(e)}")
+
+@app.delete("/tasks/{task_name}/bulk/{filename}")
+async def delete_bulk_file(task_name: str, filename: str):
+    """Removes a bulk PDF and its chunks from an existing task."""
+    task_path = _existing_task_path(task_name)
+    async with _task_edit_locks[task_path.name]:
+        if _task_status(task_path) == 'processing':
+            raise HTTPException(status_code=409, detail=f"Task '{task_path.name}' is still being processed.")
+
+        filename = Path(filename).name
+        bulk_file_path = task_path / "bulk" / filename
+        if not bulk_file_path.is_file():
+            raise HTTPException(status_code=404, detail="PDF not found.")
+
+        try:
+            entry = model.load_manifest(task_path).get(filename, {})
+            await run_in_threadpool(model.delete_documents, task_path.name, task_path, filename, entry.get("chunks"))
+            bulk_file_path.unlink()
+            manifest = model.load_manifest(task_path)
+            manifest.pop(filename, None)
+            model.save_manifest(task_path, manifest)
+            _refresh_catalog(task_path)
+        except Exception as e:
+            print(f"Error deleting {filename} from {task_path.name}: {e}")
+            raise HTTPException(status_code=500, detail=f"File deletion failed: {str(e)}")
+
+    return {"status": "deleted", "task_name": task_path.name, "filename": filename}
+
+@app.get("/tasks/{task_name}/index_config")
+async def get_index_config(task_name: str):
+    """The task's distance metric, HNSW and quantization settings."""
+    task_path = _existing_task_path(task_name)
+    return {"task_name": task_path.name, **index_config.load(task_path)}
+
+@app.patch("/tasks/{task_name}/index_config")
+async def update_index_config(task_name: str, index_settings: IndexSettings):
+    """
+    Changes a task's index settings. ef_search, quantization and
+    rerank_factor can change at any time; space, hnsw_m and ef_construction
+    only until the task is indexed. Turning quantization on builds the
+    task's quantized index before returning.
+    """
+    task_path = _existing_task_path(task_name)
+    if _task_status(task_path) == 'processing':
+        raise HTTPException(status_code=409, detail=f"Task '{task_path.name}' is still being processed.")
+
+    try:
+        config = await run_in_threadpool(
+            model.update_index_config, task_path.name, task_path, index_settings.model_dump(exclude_none=True)
+        )
+    except index_config.FrozenSettingError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"Error updating index settings of {task_path.name}: {e}")
+        raise HTTPException(status_code=500, detail=f"Updating index settings failed: {str(e)}")
+    return {"task_name": task_path.name, **config}
+
+@app.get("/embedding_cache/stats")
+async def get_embedding_cache_stats():
+    """Hit/miss counts and size of the shared embedding cache."""
+    return model.EMBEDDING_CACHE.stats()
+
+@app.get("/query_cache/stats")
+async def get_query_cache_stats():
+    """Hit rates of the query embedding, search result and LLM response caches."""
+    return {
+        "query_embeddings": model.QUERY_EMBEDDINGS.stats(),
+        "search_results": model.SEARCH_RESULTS.stats(),
+        "llm_responses": model.LLM_RESPONSES.stats(),
+    }
+
+@app.get("/health/live")
+async def liveness():
+    """The server is up and serving requests."""
+    return {"status": "alive", "model": model.model_status()}
+
+@app.get("/health/ready")
+async def readiness():
+    """Ready once the embedding model is loaded; 503 while it loads or if it failed."""
+    status = model.model_status()
+    if status["state"] != "ready":
+        return JSONResponse(status_code=503, content={"status": "not_ready", "model": status})
+    return {"status": "ready", "model": status}
+
+@app.get("/metrics")
+async def get_metrics():
+    """Per-stage latency histograms and counters in the Prometheus text format."""
+    return Response(content=metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+def _find_pdf(task_name: str, filename: str) -> Path:
+    task_path = TASK_DIR / Path(task_name).name
+    filename = Path(filename).name
+    for folder in ("fresh", "bulk"):
+        pdf_path = task_path / folder / filename
+        if pdf_path.is_file():
+            return pdf_path
     raise HTTPException(status_code=404, detail="PDF not found.")
 
+
+def _not_modified(request: Request, etag: str, mtime: float) -> bool:
+    """Whether the client's cached copy is still current, per If-None-Match or If-Modified-Since."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+@app.get("/pdfs/{task_name}/{filename}")
+async def get_pdf(task_name: str, filename: str, request: Request):
+    """
+    Serves a task's PDF. Range requests get partial content so the viewer can
+    load pages lazily, and ETag/Last-Modified let it revalidate a copy it
+    already has (304) instead of downloading the whole file again.
+    """
+    pdf_path = _find_pdf(task_name, filename)
+    stat = pdf_path.stat()
+    etag = '"' + hashlib.md5(f"{stat.st_mtime_ns}-{stat.st_size}".encode("utf-8")).hexdigest() + '"'
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        "Cache-Control": "no-cache",
+    }
+    if _not_modified(request, etag, stat.st_mtime):
+        return Response(status_code=304, headers=headers)
+    # FileResponse answers Range and If-Range requests itself.
+    return FileResponse(pdf_path, media_type="application/pdf", headers=headers, stat_result=stat)
+
+
+@app.get("/pdfs/{task_name}/{filename}/pages/{page_number}")
+async def get_pdf_page(
+    task_name: str,
+    filename: str,
+    page_number: int,
+    request: Request,
+    page_format: Literal["png", "text"] = Query("png", alias="format"),
+    zoom: float = Query(1.5, gt=0, le=4),
+):
+    """
+    Returns one page of a task's PDF, 1-based like recommendation page
+    numbers, as a PNG rendered at `zoom` times 72 dpi or as plain text
+    (?format=text), so a recommended page can be shown without fetching the
+    whole PDF. Rendered pages are kept in PAGE_CACHE.
+    """
+    pdf_path = _find_pdf(task_name, filename)
+    stat = pdf_path.stat()
+    key = page_render.PageCache.key(pdf_path, stat, page_number, page_format, zoom)
+    headers = {
+        "ETag": f'"{key}"',
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        "Cache-Control": "no-cache",
+    }
+    if _not_modified(request, headers["ETag"], stat.st_mtime):
+        return Response(status_code=304, headers=headers)
+    try:
+        content = await run_in_threadpool(PAGE_CACHE.render, key, pdf_path, page_number, page_format, zoom)
+    except page_render.PageNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to render page: {str(e)}")
+    return Response(content=content, media_type=page_render.MEDIA_TYPES[page_format], headers=headers)
+
 app.mount("/", StaticFiles(directory=FRONTEND_BUILD_DIR, html=True), name="static")
 
 @app.get("/{full_path:path}")
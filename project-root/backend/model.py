@@ -1,166 +1,918 @@
 import os
+import json
 import time
+import hashlib
+import requests
+import queue
+import threading
+from collections import defaultdict
 from pathlib import Path
-from typing import List, Dict, Any
-import re
-import fitz
-from sentence_transformers import SentenceTransformer
-from chromadb import PersistentClient
-
-# Initialize the embedding model to load it once (force CPU usage)
-try:
-    EMBEDDING_MODEL = SentenceTransformer('all-MiniLM-L6-v2', device='cpu')
-except Exception as e:
-    print(f"Error loading SentenceTransformer model: {e}")
-    EMBEDDING_MODEL = None
-
-def preprocess_text(text: str) -> str:
-    """Cleans and normalizes text for better embedding quality."""
-    text = re.sub(r'(\w+)-\n(\w+)', r'\1\2', text)
-    text = re.sub(r'\n+', ' ', text).strip()
-    text = re.sub(r'\s+', ' ', text).strip()
-    return text
-
-def chunk_text(pdf_path: Path) -> List[Dict[str, Any]]:
-    """Extracts and chunks text from a PDF, splitting by paragraph."""
-    chunks: List[Dict[str, Any]] = []
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Optional, Tuple
+import numpy as np
+from chunking import iter_pdf_chunks, CHUNKING_SIGNATURE, CHUNKER, CHUNK_MAX_TOKENS
+from embedding_cache import EmbeddingCache, file_sha256
+from collection_registry import CollectionRegistry
+from lexical_index import BM25Index
+from quantized_index import QuantizedIndex
+from sqlite_mirror import SQLiteMirror
+from ttl_cache import TTLCache
+import embedding_backend
+import index_config
+import metrics
+
+EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
+# Cached vectors are only reused with the backend that produced them.
+EMBEDDING_SIGNATURE = f"{EMBEDDING_MODEL_NAME}:{embedding_backend.EMBEDDING_BACKEND}"
+
+# The embedding model is loaded on first use, or in the background by
+# warm_up_model, so importing this module (and starting the server) does not
+# wait for torch and the weights. Use get_embedding_model() to access it.
+EMBEDDING_MODEL = None
+# Memory-map torch weights from a file in MODEL_WEIGHTS_DIR so worker
+# processes share one read-only copy. transformers already maps safetensors
+# checkpoints like all-MiniLM-L6-v2's, so this matters for other checkpoint
+# formats; benchmarks/bench_startup.py reports per-worker memory either way.
+EMBEDDING_MMAP_WEIGHTS = os.getenv("EMBEDDING_MMAP_WEIGHTS", "false").lower() == "true"
+MODEL_WEIGHTS_DIR = Path(os.getenv("MODEL_WEIGHTS_DIR", Path(__file__).parent.parent / "cache" / "models"))
+
+_model_lock = threading.Lock()
+_model_state: Dict[str, Any] = {"state": "not_loaded", "error": None, "load_seconds": None}
+
+def get_embedding_model():
+    """
+    Returns the embedding model, loading it on first use (concurrent callers
+    wait for the same load). Returns None if it failed to load.
+    """
+    global EMBEDDING_MODEL
+    if EMBEDDING_MODEL is not None:
+        return EMBEDDING_MODEL
+    with _model_lock:
+        if EMBEDDING_MODEL is None and _model_state["state"] != "failed":
+            _model_state["state"] = "loading"
+            start_time = time.time()
+            weights_path = MODEL_WEIGHTS_DIR / f"{EMBEDDING_MODEL_NAME}.pt" if EMBEDDING_MMAP_WEIGHTS else None
+            try:
+                encoder = embedding_backend.load_model(EMBEDDING_MODEL_NAME, weights_path=weights_path)
+                # The first forward pass initializes kernels; pay for it here.
+                encoder.encode(["warm up"])
+            except Exception as e:
+                print(f"Error loading SentenceTransformer model: {e}")
+                _model_state.update(state="failed", error=str(e))
+                return None
+            if CHUNKER != "sentence" and CHUNK_MAX_TOKENS > encoder.max_seq_length:
+                print(f"Warning: CHUNK_MAX_TOKENS={CHUNK_MAX_TOKENS} exceeds the model's max sequence length "
+                      f"({encoder.max_seq_length}); the end of long chunks will be ignored when embedding.")
+            EMBEDDING_MODEL = encoder
+            _model_state.update(state="ready", load_seconds=round(time.time() - start_time, 2))
+            print(f"Loaded embedding model {EMBEDDING_SIGNATURE} in {_model_state['load_seconds']}s.")
+    return EMBEDDING_MODEL
+
+def warm_up_model() -> threading.Thread:
+    """Starts loading the embedding model on a background thread."""
+    thread = threading.Thread(target=get_embedding_model, name="model-warmup", daemon=True)
+    thread.start()
+    return thread
+
+def model_status() -> Dict[str, Any]:
+    """Reports whether the embedding model is not_loaded, loading, ready or failed."""
+    status = {"model": EMBEDDING_SIGNATURE, **_model_state}
+    if EMBEDDING_MODEL is not None:
+        # Also covers a model assigned directly, e.g. by benchmarks.
+        status["state"] = "ready"
+    return status
+
+# Vectors of previously embedded PDFs, shared by all tasks.
+EMBEDDING_CACHE = EmbeddingCache(
+    Path(os.getenv("EMBEDDING_CACHE_DIR", Path(__file__).parent.parent / "cache" / "embeddings")),
+    max_bytes=int(os.getenv("EMBEDDING_CACHE_MAX_MB", "1024")) * 1024 * 1024,
+)
+
+# Open task collections shared by ingestion and queries.
+COLLECTIONS = CollectionRegistry(
+    max_open=int(os.getenv("CHROMA_MAX_OPEN_TASKS", "32")),
+    max_bytes=int(os.getenv("CHROMA_MAX_OPEN_MB", "2048")) * 1024 * 1024,
+    configuration=index_config.collection_configuration,
+)
+
+# Every task's chunks are also written to one shared collection, tagged with
+# their task name, so searching all tasks is a single index lookup. It is
+# kept open by its own registry so task collections never evict it.
+GLOBAL_INDEX_PATH = Path(os.getenv("GLOBAL_INDEX_DIR", Path(__file__).parent.parent / "global_index"))
+GLOBAL_COLLECTION = "all_tasks"
+GLOBAL_INDEX = CollectionRegistry(max_open=1, max_bytes=1 << 62)
+# Index version of each task as last copied to the global index. The name
+# changes whenever global chunk ids change format, so every task is copied again.
+GLOBAL_SYNCED_FILE = "synced-v2.json"
+GLOBAL_SEARCH_KEY = "__global__"
+# Serializes a task's index writes with rebuilds of its global and lexical copies.
+_task_locks: Dict[str, threading.RLock] = defaultdict(threading.RLock)
+_global_synced_lock = threading.Lock()
+
+# Per-task record of each bulk PDF's content hash and chunk count.
+MANIFEST_FILE = "manifest.json"
+# BM25 index of each task's chunks, next to its chroma directory.
+LEXICAL_INDEX_FILE = "bm25.sqlite3"
+# Tasks configured with quantization "int8" answer vector queries from this
+# index rather than their Chroma collection.
+QUANTIZED_INDEX_FILE = "vectors_int8.sqlite3"
+# "vector" ranks by embedding similarity, "lexical" by BM25 and "hybrid"
+# fuses both rankings with reciprocal rank fusion.
+SEARCH_MODES = ("vector", "lexical", "hybrid")
+SEARCH_MODE = os.getenv("SEARCH_MODE", "hybrid")
+# Each ranking contributes this many candidates to the fusion, per result.
+HYBRID_CANDIDATES_PER_RESULT = 4
+RRF_K = 60
+# Changes whenever a task's index is written, so cached results for it expire.
+INDEX_VERSION_FILE = "index_version.txt"
+
+# Repeated queries skip the encoder and the vector search; repeated prompts
+# skip the LLM.
+QUERY_EMBEDDINGS = TTLCache(
+    max_entries=int(os.getenv("QUERY_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("QUERY_CACHE_TTL", "600")),
+)
+SEARCH_RESULTS = TTLCache(
+    max_entries=int(os.getenv("QUERY_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("QUERY_CACHE_TTL", "600")),
+)
+LLM_RESPONSES = TTLCache(
+    max_entries=int(os.getenv("LLM_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("LLM_CACHE_TTL", "3600")),
+)
+# In-memory codes of the most recently queried quantized task indexes.
+QUANTIZED_VECTORS = TTLCache(
+    max_entries=int(os.getenv("QUANTIZED_CACHE_TASKS", "8")),
+    ttl=float(os.getenv("QUANTIZED_CACHE_TTL", "3600")),
+)
+
+# Chunks are encoded and written in batches of this size while parsing continues.
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "256"))
+# Maximum number of batches buffered between pipeline stages.
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "4"))
+
+def _no_progress(**counters):
+    pass
+
+class _StageError:
+    def __init__(self, error: Exception):
+        self.error = error
+
+_STAGE_DONE = object()
+
+def _run_in_background(iterable: Iterable, maxsize: int, name: str) -> Iterator:
+    """
+    Iterates `iterable` on a background thread, buffering at most `maxsize`
+    items ahead of the consumer. Errors are re-raised in the consumer.
+    """
+    buffer: queue.Queue = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+            put(_STAGE_DONE)
+        except Exception as e:
+            put(_StageError(e))
+
+    thread = threading.Thread(target=produce, name=name, daemon=True)
+    thread.start()
     try:
-        doc = fitz.open(pdf_path)
-        for page_num, page in enumerate(doc, start=1):
-            text = page.get_text()
-            
-            cleaned_text = preprocess_text(text)
-            
-            paragraphs = [p.strip() for p in cleaned_text.split('.') if p.strip()]
-
-            for para in paragraphs:
-                chunks.append({
-                    "text": para,
-                    "pdf_name": pdf_path.name,
-                    "page_number": page_num
-                })
-        doc.close()
-    except Exception as e:
-        print(f"Error parsing PDF {pdf_path}: {e}")
-    return chunks
+        while True:
+            item = buffer.get()
+            if item is _STAGE_DONE:
+                return
+            if isinstance(item, _StageError):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+
+class _ChromaWriter:
+    """
+    Adds embedded batches to collections on a background thread. Each of
+    `collections` is a (collection, extra metadata, id prefix) triple; the
+    extra metadata is merged into every chunk written to that collection
+    and the prefix is prepended to its id.
+    """
+
+    def __init__(self, collections: List[Tuple[Any, Dict[str, Any], str]], maxsize: int, on_written: Callable[[int], None]):
+        self.collections = collections
+        self.on_written = on_written
+        self.error: Optional[Exception] = None
+        self._queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self._thread = threading.Thread(target=self._run, name="chroma-writer", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                return
+            if self.error is not None:
+                continue
+            try:
+                for collection, extra_metadata, id_prefix in self.collections:
+                    metadatas = [{**m, **extra_metadata} for m in batch["metadatas"]]
+                    ids = [id_prefix + i for i in batch["ids"]]
+                    if isinstance(collection, BM25Index):
+                        stage = "bm25_add"
+                    elif isinstance(collection, QuantizedIndex):
+                        stage = "quantized_add"
+                    else:
+                        stage = "chroma_add"
+                    with metrics.stage(stage, items=len(batch["ids"])):
+                        collection.add(**{**batch, "ids": ids, "metadatas": metadatas})
+                self.on_written(len(batch["ids"]))
+            except Exception as e:
+                self.error = e
+
+    def add(self, **batch):
+        if self.error is not None:
+            raise self.error
+        self._queue.put(batch)
 
-# In model.py
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
 
-def embed_documents(task_name: str, bulk_dir: Path, task_path: Path):
+class _PendingCacheEntry:
+    """Collects a freshly parsed PDF's vectors until all of its chunks are encoded."""
+
+    def __init__(self, key: str, expected: int):
+        self.key = key
+        self.expected = expected
+        self.texts: List[str] = []
+        self.pages: List[int] = []
+        self.vectors: List[Any] = []
+
+    def add(self, chunk: Dict[str, Any]):
+        self.texts.append(chunk['text'])
+        self.pages.append(chunk['page_number'])
+        self.vectors.append(chunk['embedding'])
+        if len(self.texts) == self.expected:
+            EMBEDDING_CACHE.put(self.key, self.texts, self.pages, np.array(self.vectors))
+
+def _iter_chunks(pdf_items: Iterable[Tuple[Path, Optional[str]]], progress: Callable[..., None], manifest: Dict[str, Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """
+    Yields the chunks of every PDF, numbered per PDF in 'chunk_index'.
+    `pdf_items` gives (pdf_path, sha256) pairs; a None hash is computed here.
+    Chunks of PDFs found in the embedding cache already carry their
+    'embedding'; the rest are parsed and tagged so their vectors are cached
+    once encoded. Each PDF's hash and chunk count are recorded in `manifest`.
+    """
+    pdfs_done = 0
+    pdfs_cached = 0
+    chunks_total = 0
+    keys: Dict[Path, str] = {}
+    # Cache entries found for PDFs the parser has not handed back yet; the
+    # parser's window bounds how many are held at once.
+    hits: Dict[Path, Tuple[List[str], List[int], Any]] = {}
+
+    def paths() -> Iterator[Path]:
+        for pdf_path, content_hash in pdf_items:
+            content_hash = content_hash or file_sha256(pdf_path)
+            manifest[pdf_path.name] = {"sha256": content_hash, "chunks": 0}
+            key = EmbeddingCache.key(content_hash, EMBEDDING_SIGNATURE, CHUNKING_SIGNATURE)
+            entry = EMBEDDING_CACHE.get(key)
+            if entry is None:
+                keys[pdf_path] = key
+            else:
+                hits[pdf_path] = entry
+            yield pdf_path
+
+    # Cached PDFs pass through the parser unparsed, so every PDF comes back
+    # in order as soon as it is ready.
+    for pdf_path, chunks in iter_pdf_chunks(paths(), skip=hits.__contains__):
+        if chunks is None:
+            texts, pages, vectors = hits.pop(pdf_path)
+            manifest[pdf_path.name]["chunks"] = len(texts)
+            pdfs_done += 1
+            pdfs_cached += 1
+            chunks_total += len(texts)
+            progress(pdfs_parsed=pdfs_done, pdfs_cached=pdfs_cached, chunks_total=chunks_total)
+            for i, (text, page_number, vector) in enumerate(zip(texts, pages, vectors)):
+                yield {"text": text, "pdf_name": pdf_path.name, "page_number": page_number, "chunk_index": i, "embedding": vector}
+            continue
+        pdfs_done += 1
+        chunks_total += len(chunks)
+        manifest[pdf_path.name]["chunks"] = len(chunks)
+        progress(pdfs_parsed=pdfs_done, chunks_total=chunks_total)
+        if not chunks:
+            EMBEDDING_CACHE.put(keys[pdf_path], [], [], np.empty((0, 0), dtype=np.float32))
+            continue
+        pending = _PendingCacheEntry(keys[pdf_path], len(chunks))
+        for i, chunk in enumerate(chunks):
+            chunk['chunk_index'] = i
+            chunk['cache_entry'] = pending
+            yield chunk
+
+def _count_pdfs(pdf_items: Iterable[Tuple[Path, Optional[str]]], progress: Callable[..., None]) -> Iterator[Tuple[Path, Optional[str]]]:
+    for pdfs_total, item in enumerate(pdf_items, 1):
+        progress(pdfs_total=pdfs_total)
+        yield item
+
+def _stream_batches(pdf_items: Iterable[Tuple[Path, Optional[str]]], batch_size: int, progress: Callable[..., None], manifest: Dict[str, Dict[str, Any]]) -> Iterator[List[Dict[str, Any]]]:
+    """Streams the chunks of all PDFs in batches of `batch_size`."""
+    batch: List[Dict[str, Any]] = []
+    for chunk in _iter_chunks(pdf_items, progress, manifest):
+        batch.append(chunk)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+    progress(stage="embedding")
+
+def index_version(task_path: Path) -> str:
+    try:
+        return (task_path / INDEX_VERSION_FILE).read_text().strip()
+    except FileNotFoundError:
+        return "0"
+
+def _index_changed(task_path: Path):
+    """Bumps the task's index version and drops everything cached for it."""
+    (task_path / INDEX_VERSION_FILE).write_text(str(time.time_ns()))
+    # Drop the handle so its size estimate and index are reloaded.
+    COLLECTIONS.invalidate(task_path)
+    SEARCH_RESULTS.discard_where(lambda key: key[0] in (str(task_path), GLOBAL_SEARCH_KEY))
+    QUANTIZED_VECTORS.discard_where(lambda key: key[0] == str(task_path))
+
+def normalize_query(query_text: str) -> str:
+    """Collapses whitespace so trivially different selections share cache entries."""
+    return " ".join((query_text or "").split())
+
+def _encode_queries(query_texts: List[str]) -> List[List[float]]:
+    """Embeds queries, encoding all cache misses in a single forward pass."""
+    # all-MiniLM-L6-v2 lowercases its input, so case can be folded in the key.
+    keys = [(EMBEDDING_SIGNATURE, q.casefold()) for q in query_texts]
+    embeddings = [QUERY_EMBEDDINGS.get(key) for key in keys]
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    if missing:
+        with metrics.stage("query_encode", items=len(missing)):
+            encoded = embedding_backend.encode(get_embedding_model(), [query_texts[i] for i in missing]).tolist()
+        for i, embedding in zip(missing, encoded):
+            embeddings[i] = embedding
+            QUERY_EMBEDDINGS.put(keys[i], embedding)
+    return embeddings
+
+def chunk_id(task_name: str, pdf_name: str, chunk_index: int) -> str:
+    """Stable Chroma id of a PDF's chunk, independent of batching."""
+    return f"{task_name}_{pdf_name}_chunk_{chunk_index}"
+
+def global_id_prefix(task_name: str) -> str:
+    """
+    Prefix of the task's chunk ids in the global index. Task and PDF names
+    cannot contain "/", so ids of different tasks never collide there.
+    """
+    return f"{task_name}/"
+
+def embed_documents(task_name: str, bulk_dir: Path, task_path: Path, progress: Optional[Callable[..., None]] = None,
+                    pdf_stream: Optional[Iterable[Tuple[Path, str]]] = None) -> Dict[str, Dict[str, Any]]:
     """
     Processes all PDFs in a directory, embeds them, and stores them in ChromaDB.
     The ChromaDB files are saved in a 'chroma' subdirectory within the task path.
+
+    Parsing, encoding and writing run as overlapping stages connected by
+    bounded queues, so memory stays flat regardless of corpus size.
+    PDFs already embedded for any task are served from EMBEDDING_CACHE.
+    If given, `progress` is called with keyword counters (pdfs_total, pdfs_parsed,
+    pdfs_cached, chunks_total, chunks_embedded, stage) as work advances.
+    If `pdf_stream` is given, PDFs are taken from it as (path, sha256) pairs
+    as they become available instead of listing `bulk_dir`, so a PDF can be
+    embedded while later ones are still being uploaded.
+
+    Returns manifest entries ({"sha256", "chunks"}) for the embedded PDFs.
     """
-    if not EMBEDDING_MODEL:
+    if progress is None:
+        progress = _no_progress
+
+    if get_embedding_model() is None:
         print("Embedding model not loaded. Skipping embedding process.")
-        return
+        return {}
 
     print(f"Starting embedding process for task: {task_name}")
     start_time = time.time()
 
     chroma_db_path = str(task_path / "chroma")
-    client = PersistentClient(path=chroma_db_path)
-    collection = client.get_or_create_collection(name=task_name)
 
-    pdf_files = [f for f in os.listdir(bulk_dir) if f.lower().endswith(".pdf")]
-    
-    all_chunks: List[Dict[str, Any]] = []
-    for pdf_file in pdf_files:
-        pdf_path = bulk_dir / pdf_file
-        all_chunks.extend(chunk_text(pdf_path))
+    if pdf_stream is None:
+        pdf_files = [f for f in os.listdir(bulk_dir) if f.lower().endswith(".pdf")]
+        pdf_items = [(bulk_dir / pdf_file, None) for pdf_file in pdf_files]
+        progress(stage="parsing", pdfs_total=len(pdf_files))
+    else:
+        progress(stage="parsing")
+        pdf_items = _count_pdfs(pdf_stream, progress)
 
-    if not all_chunks:
-        print("No chunks to embed.")
-        return
-
-    texts = [c['text'] for c in all_chunks]
-    metadatas = [{"pdf_name": c['pdf_name'], "page_number": c['page_number']} for c in all_chunks]
-
-    # Batching logic starts here
-    batch_size = 5000  # A safe batch size, slightly below the max limit
-    num_batches = (len(all_chunks) + batch_size - 1) // batch_size
-    
-    print(f"Total chunks to embed: {len(all_chunks)}. Splitting into {num_batches} batches of size {batch_size}.")
-
-    for i in range(num_batches):
-        start_index = i * batch_size
-        end_index = min((i + 1) * batch_size, len(all_chunks))
-        
-        batch_texts = texts[start_index:end_index]
-        batch_metadatas = metadatas[start_index:end_index]
-        
-        # Embed the current batch
-        embeddings = EMBEDDING_MODEL.encode(batch_texts, convert_to_tensor=False)
+    chunks_embedded = 0
+    def on_written(count: int):
+        nonlocal chunks_embedded
+        chunks_embedded += count
+        progress(chunks_embedded=chunks_embedded)
+
+    manifest: Dict[str, Dict[str, Any]] = {}
+    batches = _run_in_background(
+        _stream_batches(pdf_items, EMBED_BATCH_SIZE, progress, manifest),
+        maxsize=PIPELINE_QUEUE_SIZE,
+        name=f"parse-{task_name}",
+    )
+    mirrors = _task_mirrors(task_path)
+    with _task_locks[task_name]:
+        in_sync = _in_global_index(task_name, task_path)
+        mirrors_in_sync = [_mirror_in_sync(mirror, task_path) for mirror in mirrors]
+        chunk_count = 0
+        succeeded = False
         try:
-            embeddings_list = embeddings.tolist()
-        except AttributeError:
-            embeddings_list = embeddings
-
-        batch_ids = [f"{task_name}_{meta['pdf_name']}_page_{meta['page_number']}_chunk_{j}" 
-                     for j, meta in enumerate(batch_metadatas)]
-
-        print(f"Adding batch {i+1}/{num_batches} with size {len(batch_texts)}...")
-        
-        # Add the batch to the collection
-        collection.add(
-            embeddings=embeddings_list,
-            documents=batch_texts,
-            metadatas=batch_metadatas,
-            ids=batch_ids
-        )
+            with COLLECTIONS.open(task_name, task_path) as collection, \
+                    GLOBAL_INDEX.open(GLOBAL_COLLECTION, GLOBAL_INDEX_PATH) as global_collection:
+                targets = [
+                    (collection, {}, ""),
+                    (global_collection, {"task_name": task_name}, global_id_prefix(task_name)),
+                ]
+                targets += [(mirror, {}, "") for mirror, was_in_sync in zip(mirrors, mirrors_in_sync) if was_in_sync]
+                writer = _ChromaWriter(targets, maxsize=PIPELINE_QUEUE_SIZE, on_written=on_written)
+                try:
+                    for batch in batches:
+                        batch_texts = [c['text'] for c in batch]
+                        batch_metadatas = [{"pdf_name": c['pdf_name'], "page_number": c['page_number']} for c in batch]
+
+                        # Only chunks missing from the embedding cache need encoding.
+                        fresh = [c for c in batch if 'embedding' not in c]
+                        if fresh:
+                            with metrics.stage("encode_batch", items=len(fresh)):
+                                vectors = embedding_backend.encode(get_embedding_model(), [c['text'] for c in fresh])
+                            for chunk, vector in zip(fresh, vectors):
+                                chunk['embedding'] = vector
+                                chunk['cache_entry'].add(chunk)
+                        embeddings_list = np.asarray([c['embedding'] for c in batch], dtype=np.float32).tolist()
+
+                        batch_ids = [chunk_id(task_name, c['pdf_name'], c['chunk_index']) for c in batch]
+                        chunk_count += len(batch)
+
+                        writer.add(
+                            embeddings=embeddings_list,
+                            documents=batch_texts,
+                            metadatas=batch_metadatas,
+                            ids=batch_ids
+                        )
+                finally:
+                    writer.close()
+                if writer.error is not None:
+                    raise writer.error
+            succeeded = True
+        finally:
+            # Batches written before a failure stay in the indexes, so the
+            # version moves on and cached results and handles are dropped
+            # either way. After a failure the BM25, quantized and global
+            # copies are left behind that version, so they are rebuilt from
+            # the collection: the first two on their next query, the global
+            # one on its next sync.
+            _index_changed(task_path)
+            if succeeded:
+                _global_index_changed(task_name, task_path, in_sync)
+                for mirror, was_in_sync in zip(mirrors, mirrors_in_sync):
+                    _mirror_changed(task_name, task_path, mirror, was_in_sync)
+
+    if not chunk_count:
+        print("No chunks to embed.")
+        return manifest
 
     end_time = time.time()
-    print(f"Embedded {len(all_chunks)} chunks for {task_name} in {end_time - start_time:.2f}s.")
+    print(f"Embedded {chunk_count} chunks for {task_name} in {end_time - start_time:.2f}s.")
     print(f"ChromaDB embeddings saved to: {chroma_db_path}")
+    return manifest
 
-def get_recommendations(task_name: str, query_text: str, task_path: Path) -> List[Dict[str, Any]]:
+def delete_documents(task_name: str, task_path: Path, pdf_name: str, chunk_count: Optional[int] = None):
+    """
+    Removes a PDF's chunks from the task's collection. With a known chunk
+    count the stable ids are deleted directly; otherwise (tasks indexed
+    before manifests existed) chunks are matched by their pdf_name metadata.
+    """
+    mirrors = _task_mirrors(task_path)
+    with _task_locks[task_name]:
+        in_sync = _in_global_index(task_name, task_path)
+        mirrors_in_sync = [_mirror_in_sync(mirror, task_path) for mirror in mirrors]
+        targets = [mirror for mirror, was_in_sync in zip(mirrors, mirrors_in_sync) if was_in_sync]
+        with COLLECTIONS.open(task_name, task_path) as collection, \
+                GLOBAL_INDEX.open(GLOBAL_COLLECTION, GLOBAL_INDEX_PATH) as global_collection:
+            if chunk_count is not None:
+                if chunk_count:
+                    ids = [chunk_id(task_name, pdf_name, i) for i in range(chunk_count)]
+                    collection.delete(ids=ids)
+                    global_collection.delete(ids=[global_id_prefix(task_name) + i for i in ids])
+                    for mirror in targets:
+                        mirror.delete(ids=ids)
+            else:
+                collection.delete(where={"pdf_name": pdf_name})
+                global_collection.delete(where={"$and": [{"task_name": task_name}, {"pdf_name": pdf_name}]})
+                for mirror in targets:
+                    mirror.delete(where={"pdf_name": pdf_name})
+        _index_changed(task_path)
+        _global_index_changed(task_name, task_path, in_sync)
+        for mirror, was_in_sync in zip(mirrors, mirrors_in_sync):
+            _mirror_changed(task_name, task_path, mirror, was_in_sync)
+
+def load_manifest(task_path: Path) -> Dict[str, Dict[str, Any]]:
+    """Returns the task's per-PDF manifest: {pdf_name: {"sha256", "chunks"}}."""
+    manifest_path = task_path / MANIFEST_FILE
+    if not manifest_path.exists():
+        return {}
+    try:
+        return json.loads(manifest_path.read_text())
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Error reading manifest for {task_path.name}: {e}")
+        return {}
+
+def save_manifest(task_path: Path, manifest: Dict[str, Dict[str, Any]]):
+    tmp_path = task_path / (MANIFEST_FILE + ".tmp")
+    tmp_path.write_text(json.dumps(manifest, indent=4))
+    os.replace(tmp_path, task_path / MANIFEST_FILE)
+
+def get_recommendations(task_name: str, query_text: str, task_path: Path, n_results: int = 5,
+                        mode: Optional[str] = None) -> List[Dict[str, Any]]:
     """
     Performs a semantic search on a given task's documents and returns relevant sections.
+    Results are cached per task index version and normalized query.
     """
-    if not EMBEDDING_MODEL:
+    mode = mode or SEARCH_MODE
+    if mode != "lexical" and get_embedding_model() is None:
         print("Embedding model not loaded in get_recommendations.")
         return []
 
-    chroma_db_path = str(task_path / "chroma")
-    client = PersistentClient(path=chroma_db_path)
+    if not normalize_query(query_text):
+        print("Empty query_text provided to get_recommendations.")
+        return []
+
+    return get_recommendations_batch(task_name, [query_text], task_path, n_results, mode)[0]
+
+def _reciprocal_rank_fusion(rankings: List[List[Dict[str, Any]]], n_results: int) -> List[Dict[str, Any]]:
+    """Merges rankings of hits (dicts with an 'id') by the sum of 1 / (RRF_K + rank)."""
+    scores: Dict[str, float] = {}
+    hits: Dict[str, Dict[str, Any]] = {}
+    for ranking in rankings:
+        for rank, hit in enumerate(ranking):
+            scores[hit["id"]] = scores.get(hit["id"], 0.0) + 1.0 / (RRF_K + rank + 1)
+            hits.setdefault(hit["id"], hit)
+    best = sorted(scores, key=lambda hit_id: -scores[hit_id])[:n_results]
+    return [hits[hit_id] for hit_id in best]
+
+def get_recommendations_batch(task_name: str, query_texts: List[str], task_path: Path, n_results: int = 5,
+                              mode: Optional[str] = None) -> List[List[Dict[str, Any]]]:
+    """
+    Runs several searches against one task at once: uncached queries are
+    embedded in one encode call and looked up in one Chroma query, and in
+    "lexical" and "hybrid" mode also in the task's BM25 index.
+    Returns one list of recommendations per query, in order.
+    """
+    mode = mode or SEARCH_MODE
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode {mode!r}; expected one of {SEARCH_MODES}")
+    if mode != "lexical" and get_embedding_model() is None:
+        print("Embedding model not loaded in get_recommendations_batch.")
+        return [[] for _ in query_texts]
+
+    query_texts = [normalize_query(q) for q in query_texts]
+    version = index_version(task_path)
+    cache_keys = [(str(task_path), version, q.casefold(), n_results, mode) for q in query_texts]
+
+    all_recommendations: List[Optional[List[Dict[str, Any]]]] = []
+    for query_text, cache_key in zip(query_texts, cache_keys):
+        all_recommendations.append(SEARCH_RESULTS.get(cache_key) if query_text else [])
 
+    missing = [i for i, recs in enumerate(all_recommendations) if recs is None]
+    if not missing:
+        return [[dict(rec) for rec in recs] for recs in all_recommendations]
+
+    n_candidates = n_results * HYBRID_CANDIDATES_PER_RESULT if mode == "hybrid" else n_results
+    vector_hits: List[List[Dict[str, Any]]] = [[] for _ in missing]
+    quantized = _quantized_index(task_path) if mode != "lexical" else None
+    if quantized is not None:
+        query_embeddings = _encode_queries([query_texts[i] for i in missing])
+        vector_hits = _quantized_search(task_name, task_path, quantized, query_embeddings, n_candidates)
+    elif mode != "lexical":
+        query_embeddings = _encode_queries([query_texts[i] for i in missing])
+        with COLLECTIONS.open(task_name, task_path) as collection, metrics.stage("chroma_query", items=len(missing)):
+            results = collection.query(
+                query_embeddings=query_embeddings,
+                n_results=n_candidates,
+                include=["documents", "metadatas"]
+            )
+        for result_index in range(len(missing)):
+            for hit_id, document, metadata in zip(results['ids'][result_index], results['documents'][result_index],
+                                                   results['metadatas'][result_index]):
+                vector_hits[result_index].append({
+                    "id": hit_id,
+                    "pdf_name": metadata.get('pdf_name', 'N/A'),
+                    "page_number": metadata.get('page_number', 'N/A'),
+                    "text": document,
+                })
+
+    lexical_hits: List[List[Dict[str, Any]]] = [[] for _ in missing]
+    if mode != "vector":
+        lexical = BM25Index(task_path / LEXICAL_INDEX_FILE)
+        if lexical.version() != version:
+            # Tasks indexed before BM25 indexes existed get one on first use.
+            _sync_mirror(task_name, task_path, lexical)
+        for result_index, i in enumerate(missing):
+            with metrics.stage("bm25_query", items=1):
+                lexical_hits[result_index] = lexical.search(query_texts[i], n_candidates)
+
+    for result_index, i in enumerate(missing):
+        query_text = query_texts[i]
+        if mode == "vector":
+            hits = vector_hits[result_index]
+            reason = f"This section is semantically relevant to '{query_text}' based on embedding similarity."
+        elif mode == "lexical":
+            hits = lexical_hits[result_index]
+            reason = f"This section contains terms from '{query_text}'."
+        else:
+            hits = _reciprocal_rank_fusion([vector_hits[result_index], lexical_hits[result_index]], n_results)
+            reason = f"This section is relevant to '{query_text}' based on embedding similarity and matching terms."
+        recommendations = [
+            {"pdf_name": hit["pdf_name"], "section": hit["text"], "page_number": hit["page_number"], "reason": reason}
+            for hit in hits
+        ]
+        if not recommendations:
+            print(f"No results found for the query '{query_text}'.")
+        SEARCH_RESULTS.put(cache_keys[i], recommendations)
+        all_recommendations[i] = recommendations
+
+    return [[dict(rec) for rec in recs] for recs in all_recommendations]
+
+def _load_synced() -> Dict[str, str]:
     try:
-        collection = client.get_or_create_collection(name=task_name)
-    except Exception as e:
-        print(f"Error accessing collection '{task_name}': {e}")
+        return json.loads((GLOBAL_INDEX_PATH / GLOBAL_SYNCED_FILE).read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def _mark_synced(task_name: str, version: str):
+    with _global_synced_lock:
+        synced = _load_synced()
+        synced[task_name] = version
+        GLOBAL_INDEX_PATH.mkdir(parents=True, exist_ok=True)
+        tmp_path = GLOBAL_INDEX_PATH / f"{GLOBAL_SYNCED_FILE}.tmp"
+        tmp_path.write_text(json.dumps(synced, indent=4))
+        os.replace(tmp_path, GLOBAL_INDEX_PATH / GLOBAL_SYNCED_FILE)
+
+def _in_global_index(task_name: str, task_path: Path) -> bool:
+    """Whether the global index holds exactly the task's current chunks."""
+    if not (task_path / "chroma").exists():
+        return True
+    return _load_synced().get(task_name) == index_version(task_path)
+
+def _global_index_changed(task_name: str, task_path: Path, was_in_sync: bool):
+    """
+    Records that a write mirrored to the global index kept it in sync, or
+    copies the whole task if the global index was missing its older chunks.
+    """
+    if was_in_sync:
+        _mark_synced(task_name, index_version(task_path))
+    else:
+        _sync_task(task_name, task_path)
+
+def _sync_task(task_name: str, task_path: Path, page_size: int = 1000):
+    with _task_locks[task_name]:
+        version = index_version(task_path)
+        if _load_synced().get(task_name) == version:
+            return
+        print(f"Copying task {task_name} into the global index.")
+        with COLLECTIONS.open(task_name, task_path) as collection, \
+                GLOBAL_INDEX.open(GLOBAL_COLLECTION, GLOBAL_INDEX_PATH) as global_collection:
+            global_collection.delete(where={"task_name": task_name})
+            offset = 0
+            while True:
+                page = collection.get(
+                    limit=page_size,
+                    offset=offset,
+                    include=["embeddings", "documents", "metadatas"],
+                )
+                if not page["ids"]:
+                    break
+                global_collection.add(
+                    ids=[global_id_prefix(task_name) + i for i in page["ids"]],
+                    embeddings=page["embeddings"],
+                    documents=page["documents"],
+                    metadatas=[{**m, "task_name": task_name} for m in page["metadatas"]],
+                )
+                offset += len(page["ids"])
+        SEARCH_RESULTS.discard_where(lambda key: key[0] == GLOBAL_SEARCH_KEY)
+        _mark_synced(task_name, version)
+
+def _task_mirrors(task_path: Path) -> List[SQLiteMirror]:
+    """The task's BM25 index, and its quantized index if it has one."""
+    quantized = _quantized_index(task_path)
+    return [BM25Index(task_path / LEXICAL_INDEX_FILE)] + ([quantized] if quantized is not None else [])
+
+def _mirror_in_sync(mirror: SQLiteMirror, task_path: Path) -> bool:
+    """Whether the task's BM25 or quantized index holds exactly its current chunks."""
+    if not (task_path / "chroma").exists():
+        return True
+    return mirror.version() == index_version(task_path)
+
+def _mirror_changed(task_name: str, task_path: Path, mirror: SQLiteMirror, was_in_sync: bool):
+    if was_in_sync:
+        mirror.set_version(index_version(task_path))
+    else:
+        _sync_mirror(task_name, task_path, mirror)
+
+def _sync_mirror(task_name: str, task_path: Path, mirror: SQLiteMirror, page_size: int = 1000):
+    """Rebuilds the task's BM25 or quantized index from its collection if it is out of date."""
+    with _task_locks[task_name]:
+        version = index_version(task_path)
+        if mirror.version() == version:
+            return
+        print(f"Building the {mirror.KIND} for task {task_name}.")
+        mirror.clear()
+        with COLLECTIONS.open(task_name, task_path) as collection:
+            offset = 0
+            while True:
+                page = collection.get(limit=page_size, offset=offset, include=mirror.REBUILD_INCLUDE)
+                if not page["ids"]:
+                    break
+                mirror.add(ids=page["ids"], **{field: page[field] for field in mirror.REBUILD_INCLUDE})
+                offset += len(page["ids"])
+        mirror.set_version(version)
+        if isinstance(mirror, QuantizedIndex):
+            QUANTIZED_VECTORS.discard_where(lambda key: key[0] == str(task_path))
+
+def _quantized_index(task_path: Path) -> Optional[QuantizedIndex]:
+    """The task's quantized index, or None unless it is configured with quantization "int8"."""
+    config = index_config.load(task_path)
+    if config["quantization"] != "int8":
+        return None
+    return QuantizedIndex(task_path / QUANTIZED_INDEX_FILE, config["space"])
+
+def _quantized_search(task_name: str, task_path: Path, quantized: QuantizedIndex,
+                      query_embeddings: List[List[float]], n_candidates: int) -> List[List[Dict[str, Any]]]:
+    """
+    Nearest chunks from the task's quantized index. Its codes are loaded once
+    per index version and kept in QUANTIZED_VECTORS.
+    """
+    version = index_version(task_path)
+    if quantized.version() != version:
+        # Quantization was switched on after the task was indexed.
+        _sync_mirror(task_name, task_path, quantized)
+    cache_key = (str(task_path), version)
+    loaded = QUANTIZED_VECTORS.get(cache_key)
+    if loaded is None:
+        loaded = quantized.load()
+        QUANTIZED_VECTORS.put(cache_key, loaded)
+    rerank_factor = index_config.load(task_path)["rerank_factor"]
+    with metrics.stage("quantized_query", items=len(query_embeddings)):
+        return quantized.search(query_embeddings, n_candidates, n_candidates * rerank_factor, loaded)
+
+def update_index_config(task_name: str, task_path: Path, changes: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Changes the task's index settings and returns them. The settings the
+    HNSW graph is built with can only change before the task is indexed;
+    changing them later raises index_config.FrozenSettingError. Turning
+    quantization on builds the quantized index from the collection.
+    """
+    with _task_locks[task_name]:
+        config = index_config.load(task_path)
+        updated = index_config.validate({**config, **changes})
+        if (task_path / "chroma").exists():
+            frozen = [name for name in index_config.BUILD_SETTINGS if updated[name] != config[name]]
+            if frozen:
+                raise index_config.FrozenSettingError(
+                    f"{', '.join(frozen)} cannot change once the task is indexed."
+                )
+        index_config.save(task_path, updated)
+        # Reopening the collection applies the new ef_search.
+        COLLECTIONS.invalidate(task_path)
+        SEARCH_RESULTS.discard_where(lambda key: key[0] == str(task_path))
+        if updated["quantization"] == "int8" and (task_path / "chroma").exists():
+            _sync_mirror(task_name, task_path, _quantized_index(task_path))
+    return updated
+
+def sync_global_index(task_dir: Path):
+    """
+    Copies into the global index every task whose index changed since it was
+    last copied, such as tasks indexed before the global index existed.
+    Vectors are copied from the task's collection, not re-encoded.
+    """
+    for task_path in sorted(p for p in task_dir.iterdir() if (p / "chroma").is_dir()):
+        try:
+            _sync_task(task_path.name, task_path)
+        except Exception as e:
+            print(f"Error copying task {task_path.name} into the global index: {e}")
+
+def search_all_tasks(query_text: str, n_results: int = 10, task_names: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Semantic search over the chunks of every task, or only of `task_names`,
+    with one lookup in the global index. Returns the overall top `n_results`
+    with their task, PDF and page.
+    """
+    if get_embedding_model() is None:
+        print("Embedding model not loaded in search_all_tasks.")
         return []
 
-    query_text = (query_text or "").strip()
+    query_text = normalize_query(query_text)
     if not query_text:
-        print("Empty query_text provided to get_recommendations.")
         return []
 
-    query_embedding = EMBEDDING_MODEL.encode([query_text], convert_to_tensor=False)
-    try:
-        query_embedding = query_embedding.tolist()
-    except AttributeError:
-        pass
-
-    results = collection.query(
-        query_embeddings=query_embedding,
-        n_results=5,
-        include=["documents", "metadatas", "distances"]
-    )
-    
-    if not results or not results.get('ids') or not results['ids'] or not results['ids'][0]:
-        print("No results found for the given query.")
-        return []
+    task_filter = tuple(sorted(set(task_names))) if task_names else None
+    cache_key = (GLOBAL_SEARCH_KEY, task_filter, query_text.casefold(), n_results)
+    cached = SEARCH_RESULTS.get(cache_key)
+    if cached is not None:
+        return [dict(rec) for rec in cached]
 
-    recommendations: List[Dict[str, Any]] = []
-    for i in range(len(results['ids'][0])):
-        reason = (
-            f"This section is semantically relevant to '{query_text}' based on embedding similarity."
+    where = None
+    if task_filter:
+        where = {"task_name": task_filter[0]} if len(task_filter) == 1 else {"task_name": {"$in": list(task_filter)}}
+    query_embeddings = _encode_queries([query_text])
+    with GLOBAL_INDEX.open(GLOBAL_COLLECTION, GLOBAL_INDEX_PATH) as collection, metrics.stage("chroma_query", items=1):
+        results = collection.query(
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            where=where,
+            include=["documents", "metadatas", "distances"],
         )
+
+    recommendations = []
+    for doc, metadata, distance in zip(results["documents"][0], results["metadatas"][0], results["distances"][0]):
         recommendations.append({
-            "pdf_name": results['metadatas'][0][i].get('pdf_name', 'N/A'),
-            "section": results['documents'][0][i],
-            "page_number": results['metadatas'][0][i].get('page_number', 'N/A'),
-            "reason": reason
+            "task_name": metadata.get("task_name", "N/A"),
+            "pdf_name": metadata.get("pdf_name", "N/A"),
+            "page_number": metadata.get("page_number", "N/A"),
+            "section": doc,
+            "distance": distance,
         })
+    SEARCH_RESULTS.put(cache_key, recommendations)
+    return [dict(rec) for rec in recommendations]
+
+# --- LLM access ---
+# LLM_PROVIDER selects the backend: "gemini" (Google Generative AI) or
+# "openai" for any OpenAI-compatible chat completions API, such as a local
+# stub server or Ollama, reached through LLM_BASE_URL.
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", "https://api.openai.com/v1")
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+
+_gemini_lock = threading.Lock()
+_gemini_configured = False
+_llm_session = requests.Session()
+
+def _gemini_response(messages: List[Dict[str, str]], timeout: Optional[float]) -> str:
+    global _gemini_configured
+    import google.generativeai as genai
+
+    with _gemini_lock:
+        if not _gemini_configured:
+            genai.configure(api_key=os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY"))
+            _gemini_configured = True
+
+    prompt = "\n\n".join(m["content"] for m in messages)
+    request_options = {"timeout": timeout} if timeout else None
+    response = genai.GenerativeModel(GEMINI_MODEL).generate_content(prompt, request_options=request_options)
+    return response.text
+
+def _openai_response(messages: List[Dict[str, str]], timeout: Optional[float]) -> str:
+    headers = {}
+    if os.getenv("OPENAI_API_KEY"):
+        headers["Authorization"] = f"Bearer {os.getenv('OPENAI_API_KEY')}"
+    response = _llm_session.post(
+        f"{LLM_BASE_URL.rstrip('/')}/chat/completions",
+        json={"model": OPENAI_MODEL, "messages": messages},
+        headers=headers,
+        timeout=timeout,
+    )
+    response.raise_for_status()
+    return response.json()["choices"][0]["message"]["content"]
+
+def get_llm_response(messages: List[Dict[str, str]], timeout: Optional[float] = None, use_cache: bool = True) -> str:
+    """
+    Sends chat messages to the configured LLM provider and returns the reply text.
+    Replies are cached by provider, model and the full prompt, so the same
+    template filled with the same query and context is answered once.
+    """
+    provider = (os.getenv("LLM_PROVIDER") or "").lower()
+    if provider == "gemini":
+        call, model_name = _gemini_response, GEMINI_MODEL
+    elif provider == "openai":
+        call, model_name = _openai_response, OPENAI_MODEL
+    else:
+        raise RuntimeError(f"Unsupported LLM_PROVIDER: '{provider}'")
+
+    prompt_hash = hashlib.sha256(json.dumps(messages, sort_keys=True).encode("utf-8")).hexdigest()
+    cache_key = (provider, model_name, prompt_hash)
+    if use_cache:
+        cached = LLM_RESPONSES.get(cache_key)
+        if cached is not None:
+            return cached
 
-    return recommendations
+    with metrics.stage("llm_call", items=1):
+        response_text = call(messages, timeout)
+    if use_cache:
+        LLM_RESPONSES.put(cache_key, response_text)
+    return response_text
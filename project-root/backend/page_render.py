@@ -0,0 +1,49 @@
+import os
+import hashlib
+from pathlib import Path
+import fitz
+import disk_cache
+
+PAGE_FORMATS = ("png", "text")
+MEDIA_TYPES = {"png": "image/png", "text": "text/plain; charset=utf-8"}
+
+
+class PageNotFoundError(Exception):
+    """Raised when a PDF has no page with the requested number."""
+
+
+def render_page(pdf_path: Path, page_number: int, page_format: str, zoom: float) -> bytes:
+    """
+    Returns page `page_number` (1-based, like chunk metadata) of a PDF as a
+    PNG rendered at `zoom` times 72 dpi, or as UTF-8 text.
+    """
+    with fitz.open(pdf_path) as doc:
+        if not 1 <= page_number <= doc.page_count:
+            raise PageNotFoundError(f"Page {page_number} not found; the PDF has {doc.page_count} pages.")
+        page = doc[page_number - 1]
+        if page_format == "text":
+            return page.get_text().encode("utf-8")
+        return page.get_pixmap(matrix=fitz.Matrix(zoom, zoom)).tobytes("png")
+
+
+class PageCache(disk_cache.BlobCache):
+    """
+    On-disk cache of rendered pages, keyed by the PDF's path, size and
+    modification time, so a replaced PDF is never served stale pages.
+    """
+
+    SUFFIX = ".page"
+    KIND = "page cache"
+
+    @staticmethod
+    def key(pdf_path: Path, stat: os.stat_result, page_number: int, page_format: str, zoom: float) -> str:
+        identity = f"{pdf_path.resolve()}|{stat.st_size}|{stat.st_mtime_ns}|{page_number}|{page_format}|{zoom:g}"
+        return hashlib.sha256(identity.encode("utf-8")).hexdigest()
+
+    def render(self, key: str, pdf_path: Path, page_number: int, page_format: str, zoom: float) -> bytes:
+        """Returns the page cached under `key`, rendering and caching it on a miss."""
+        data = self.get(key)
+        if data is None:
+            data = render_page(pdf_path, page_number, page_format, zoom)
+            self.put(key, data)
+        return data
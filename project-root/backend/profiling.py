@@ -0,0 +1,70 @@
+import sys
+import time
+import uuid
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Optional
+
+
+_IDLE_FILES = ("threading.py", "queue.py", "thread.py")
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler that records the stack of every thread except its
+    own every `interval` seconds while running. Threads are sampled rather
+    than traced, so the overhead stays small and does not depend on how much
+    Python code runs, and work the request hands to the threadpool or to
+    ingestion threads is included.
+
+    Threads blocked waiting for work (in threading, queue or an executor) are
+    skipped. The result is written in the collapsed-stack format read by
+    flamegraph.pl and speedscope: one "frame;frame;frame count" line per
+    distinct stack, outermost frame first.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self):
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or Path(frame.f_code.co_filename).name in _IDLE_FILES:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.samples[";".join(reversed(stack))] += 1
+            self.sample_count += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def write(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        lines = [f"{stack} {count}" for stack, count in self.samples.most_common()]
+        path.write_text("\n".join(lines) + "\n")
+
+
+def profile_path(profile_dir: Path, method: str, path: str) -> Path:
+    """A unique file name for one request's profile."""
+    slug = "".join(c if c.isalnum() else "_" for c in path.strip("/"))[:60] or "root"
+    return profile_dir / f"{time.strftime('%Y%m%d-%H%M%S')}-{method.lower()}-{slug}-{uuid.uuid4().hex[:6]}.folded"
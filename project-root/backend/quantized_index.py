@@ -0,0 +1,171 @@
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from sqlite_mirror import SQLiteMirror
+
+# Codes dequantized at a time while scanning, bounding a search's scratch memory.
+SCAN_BLOCK_ROWS = 16384
+# SQLite's limit on parameters in one statement is 999 in older builds.
+_MAX_PARAMS = 900
+
+
+def quantize(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric int8 quantization with one scale per vector: vectors ≈ codes * scales[:, None]."""
+    scales = np.abs(vectors).max(axis=1) / 127
+    scales[scales == 0] = 1.0
+    codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+class QuantizedVectors:
+    """The resident part of a QuantizedIndex: int8 codes, their scales and squared norms."""
+
+    def __init__(self, rowids: np.ndarray, codes: np.ndarray, scales: np.ndarray, sq_norms: np.ndarray):
+        self.rowids = rowids
+        self.codes = codes
+        self.scales = scales
+        self.sq_norms = sq_norms
+
+    def __len__(self) -> int:
+        return len(self.rowids)
+
+    @property
+    def nbytes(self) -> int:
+        return self.rowids.nbytes + self.codes.nbytes + self.scales.nbytes + self.sq_norms.nbytes
+
+
+class QuantizedIndex(SQLiteMirror):
+    """
+    Persistent per-task vector index for large tasks. Only int8 codes of the
+    vectors (a quarter of their float32 size, with no graph links) are held
+    in memory and scanned exhaustively; the exact vectors, chunk text and
+    metadata stay on disk in SQLite. A search re-scores the best
+    `candidates` codes with their exact vectors, so only those rows are read
+    back.
+
+    Distances follow Chroma's definitions for `space`: squared L2 for "l2",
+    1 - cosine similarity for "cosine" and 1 - inner product for "ip".
+    """
+
+    KIND = "quantized index"
+    CHUNKS_TABLE = "vectors"
+    TABLES = ("vectors",)
+    REBUILD_INCLUDE = ["embeddings", "documents", "metadatas"]
+
+    def __init__(self, path: Path, space: str):
+        super().__init__(path)
+        self.space = space
+
+    def _create_tables(self, conn: sqlite3.Connection):
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS vectors (chunk_id TEXT PRIMARY KEY, pdf_name TEXT, page_number INTEGER, "
+            "text TEXT, code BLOB, scale REAL, sq_norm REAL, vector BLOB)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS vectors_pdf_name ON vectors (pdf_name)")
+
+    def _prepare(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.space == "cosine":
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.where(norms == 0, 1.0, norms)
+        return vectors
+
+    def add(self, ids: List[str], embeddings: List[List[float]], documents: List[str],
+            metadatas: List[Dict[str, Any]], **_):
+        vectors = self._prepare(embeddings)
+        codes, scales = quantize(vectors)
+        sq_norms = np.einsum("ij,ij->i", vectors, vectors)
+        rows = [
+            (chunk_id, metadata.get("pdf_name"), metadata.get("page_number"), document,
+             code.tobytes(), float(scale), float(sq_norm), vector.tobytes())
+            for chunk_id, document, metadata, code, scale, sq_norm, vector
+            in zip(ids, documents, metadatas, codes, scales, sq_norms, vectors)
+        ]
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO vectors (chunk_id, pdf_name, page_number, text, code, scale, sq_norm, vector) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        conn.close()
+
+    def load(self) -> QuantizedVectors:
+        """Reads the codes a search scans into memory."""
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT rowid, code, scale, sq_norm FROM vectors ORDER BY rowid").fetchall()
+        finally:
+            conn.close()
+        if not rows:
+            empty = np.empty(0, dtype=np.float32)
+            return QuantizedVectors(np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.int8), empty, empty)
+        rowids, codes, scales, sq_norms = zip(*rows)
+        return QuantizedVectors(
+            np.array(rowids, dtype=np.int64),
+            np.frombuffer(b"".join(codes), dtype=np.int8).reshape(len(rows), -1),
+            np.array(scales, dtype=np.float32),
+            np.array(sq_norms, dtype=np.float32),
+        )
+
+    def _distances(self, dots: np.ndarray, sq_norms: np.ndarray, query_sq_norms: np.ndarray) -> np.ndarray:
+        if self.space == "l2":
+            return query_sq_norms[:, None] - 2 * dots + sq_norms[None, :]
+        return 1 - dots
+
+    def _fetch(self, rowids: List[int]) -> Dict[int, tuple]:
+        conn = self._connect()
+        try:
+            rows = []
+            for start in range(0, len(rowids), _MAX_PARAMS):
+                batch = rowids[start:start + _MAX_PARAMS]
+                rows += conn.execute(
+                    "SELECT rowid, chunk_id, pdf_name, page_number, text, vector FROM vectors "
+                    f"WHERE rowid IN ({','.join('?' * len(batch))})",
+                    batch,
+                ).fetchall()
+        finally:
+            conn.close()
+        return {row[0]: row[1:] for row in rows}
+
+    def search(self, query_embeddings: List[List[float]], n_results: int, candidates: int,
+               loaded: Optional[QuantizedVectors] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Returns the `n_results` nearest chunks to each query, nearest first,
+        after re-scoring the `candidates` nearest by their codes exactly.
+        `loaded` is the result of an earlier `load`, to avoid reading the codes again.
+        """
+        if loaded is None:
+            loaded = self.load()
+        queries = self._prepare(query_embeddings)
+        if not len(loaded):
+            return [[] for _ in queries]
+
+        query_sq_norms = np.einsum("ij,ij->i", queries, queries)
+        approximate = np.empty((len(queries), len(loaded)), dtype=np.float32)
+        for start in range(0, len(loaded), SCAN_BLOCK_ROWS):
+            end = start + SCAN_BLOCK_ROWS
+            dots = (queries @ loaded.codes[start:end].T.astype(np.float32)) * loaded.scales[start:end]
+            approximate[:, start:end] = self._distances(dots, loaded.sq_norms[start:end], query_sq_norms)
+
+        candidates = min(max(candidates, n_results), len(loaded))
+        nearest = np.argpartition(approximate, candidates - 1, axis=1)[:, :candidates]
+        rows = self._fetch(sorted({int(rowid) for rowid in loaded.rowids[nearest].ravel()}))
+
+        results = []
+        for query, query_sq_norm, indexes in zip(queries, query_sq_norms, nearest):
+            found = [rows[int(rowid)] for rowid in loaded.rowids[indexes] if int(rowid) in rows]
+            if not found:
+                results.append([])
+                continue
+            vectors = np.frombuffer(b"".join(row[4] for row in found), dtype=np.float32).reshape(len(found), -1)
+            distances = self._distances(
+                (vectors @ query)[None, :], np.einsum("ij,ij->i", vectors, vectors), np.array([query_sq_norm])
+            )[0]
+            order = np.argsort(distances)[:n_results]
+            results.append([
+                {"id": found[i][0], "pdf_name": found[i][1], "page_number": found[i][2], "text": found[i][3],
+                 "distance": float(distances[i])}
+                for i in order
+            ])
+        return results
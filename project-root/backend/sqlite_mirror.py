@@ -0,0 +1,74 @@
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class SQLiteMirror:
+    """
+    Base of the SQLite copies of a task's chunks kept next to its Chroma
+    collection (BM25Index, QuantizedIndex). `add` and `delete` mirror the
+    collection methods so a copy can be written alongside it, and the copy
+    records the task index version it was last brought up to date with, so
+    it can be rebuilt from the collection when it falls behind.
+
+    Subclasses create their tables in `_create_tables`, name them all in
+    TABLES, and keep chunk_id and pdf_name as indexed columns of CHUNKS_TABLE.
+    """
+
+    # Shown when the copy is rebuilt.
+    KIND = "index"
+    CHUNKS_TABLE = "chunks"
+    # Dropped in this order by `clear`.
+    TABLES: Tuple[str, ...] = ("chunks",)
+    # What a rebuild reads from the collection to pass to `add`, besides ids.
+    REBUILD_INCLUDE: List[str] = ["documents", "metadatas"]
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    def _connect(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        with conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            self._create_tables(conn)
+        return conn
+
+    def _create_tables(self, conn: sqlite3.Connection):
+        raise NotImplementedError
+
+    def add(self, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]], **kwargs):
+        raise NotImplementedError
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None):
+        """Deletes chunks by id, or by an equality filter on pdf_name."""
+        with self._connect() as conn:
+            if ids:
+                conn.executemany(f"DELETE FROM {self.CHUNKS_TABLE} WHERE chunk_id = ?", [(i,) for i in ids])
+            elif where:
+                conn.execute(f"DELETE FROM {self.CHUNKS_TABLE} WHERE pdf_name = ?", (where["pdf_name"],))
+        conn.close()
+
+    def clear(self):
+        # Dropping the tables is much faster than deleting every row.
+        with self._connect() as conn:
+            for table in self.TABLES:
+                conn.execute(f"DROP TABLE IF EXISTS {table}")
+            self._create_tables(conn)
+        conn.close()
+
+    def version(self) -> Optional[str]:
+        """The task index version this copy was last brought up to date with."""
+        if not self.path.exists():
+            return None
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        finally:
+            conn.close()
+        return row[0] if row else None
+
+    def set_version(self, version: str):
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (version,))
+        conn.close()
@@ -0,0 +1,119 @@
+import json
+import time
+import sqlite3
+import threading
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
+
+_LIST_FIELDS = ("bulk_files", "fresh_files")
+_COLUMNS = (
+    "task_name", "status", "stage", "created_at", "updated_at", "bulk_files", "fresh_files",
+    "pdf_count", "chunk_count", "index_bytes", "error",
+)
+
+
+class TaskCatalog:
+    """
+    SQLite table of every task's files, status, timestamps, chunk count and
+    index size, kept up to date as tasks are uploaded and ingested so that
+    listing tasks never has to walk the task directories.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    self.path.parent.mkdir(parents=True, exist_ok=True)
+                    # WAL lets the task list be read while ingestion writes.
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.executescript("""
+                        CREATE TABLE IF NOT EXISTS tasks (
+                            task_name TEXT PRIMARY KEY,
+                            status TEXT NOT NULL,
+                            stage TEXT,
+                            created_at TEXT,
+                            updated_at REAL NOT NULL,
+                            bulk_files TEXT NOT NULL DEFAULT '[]',
+                            fresh_files TEXT NOT NULL DEFAULT '[]',
+                            pdf_count INTEGER NOT NULL DEFAULT 0,
+                            chunk_count INTEGER NOT NULL DEFAULT 0,
+                            index_bytes INTEGER NOT NULL DEFAULT 0,
+                            error TEXT
+                        );
+                        CREATE INDEX IF NOT EXISTS tasks_created_at ON tasks (created_at);
+                        CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, created_at);
+                    """)
+                    self._initialized = True
+        return conn
+
+    def upsert(self, task_name: str, **fields):
+        """Creates or updates a task's row with the given columns."""
+        unknown = set(fields) - set(_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown task catalog columns: {sorted(unknown)}")
+        values = {k: json.dumps(v) if k in _LIST_FIELDS else v for k, v in fields.items()}
+        values["updated_at"] = time.time()
+        # Only the given columns are overwritten when the row already exists.
+        updates = ", ".join(f"{c} = excluded.{c}" for c in values)
+        row = {"task_name": task_name, "status": "processing", **values}
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    f"INSERT INTO tasks ({', '.join(row)}) VALUES ({', '.join('?' * len(row))}) "
+                    f"ON CONFLICT (task_name) DO UPDATE SET {updates}",
+                    list(row.values()),
+                )
+        finally:
+            conn.close()
+
+    def delete(self, task_name: str):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM tasks WHERE task_name = ?", (task_name,))
+        finally:
+            conn.close()
+
+    def names(self) -> List[str]:
+        conn = self._connect()
+        try:
+            return [row[0] for row in conn.execute("SELECT task_name FROM tasks")]
+        finally:
+            conn.close()
+
+    def list(self, status: Optional[str] = None, name_contains: Optional[str] = None,
+             limit: Optional[int] = None, offset: int = 0) -> Tuple[List[Dict[str, Any]], int]:
+        """Returns one page of tasks, newest first, and the number of matching tasks."""
+        clauses = []
+        params: List[Any] = []
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if name_contains:
+            clauses.append("instr(lower(task_name), ?) > 0")
+            params.append(name_contains.lower())
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        conn = self._connect()
+        try:
+            total = conn.execute(f"SELECT COUNT(*) FROM tasks {where}", params).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT * FROM tasks {where} ORDER BY created_at DESC, task_name LIMIT ? OFFSET ?",
+                params + [-1 if limit is None else limit, offset],
+            ).fetchall()
+        finally:
+            conn.close()
+        tasks = []
+        for row in rows:
+            task = dict(row)
+            for field in _LIST_FIELDS:
+                task[field] = json.loads(task[field])
+            tasks.append(task)
+        return tasks, total
@@ -0,0 +1,203 @@
+import re
+import time
+import asyncio
+import hashlib
+from typing import AsyncIterator, List, Optional
+from xml.sax.saxutils import escape, quoteattr
+import httpx
+import disk_cache
+import metrics
+
+# Raw PCM matching the WAV header written by main.pcm_to_wav.
+OUTPUT_FORMAT = "raw-16khz-16bit-mono-pcm"
+SAMPLE_RATE = 16000
+
+
+class TTSError(Exception):
+    """Raised when the TTS service rejects a request."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(f"{status_code}: {detail}")
+        self.status_code = status_code
+        self.detail = detail
+
+
+def split_script(script: str, max_chars: int) -> List[str]:
+    """
+    Splits a script into segments of whole sentences of at most `max_chars`
+    characters. A single sentence longer than that becomes its own segment.
+    """
+    sentences = [s for s in re.split(r'(?<=[.!?])\s+|\n+', script.strip()) if s.strip()]
+    segments = []
+    current = ""
+    for sentence in sentences:
+        sentence = sentence.strip()
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            segments.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        segments.append(current)
+    return segments
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, TTSError):
+        return error.status_code == 429 or error.status_code >= 500
+    return isinstance(error, httpx.TransportError)
+
+
+class SegmentCache(disk_cache.BlobCache):
+    """
+    On-disk cache of synthesized PCM keyed by voice and segment text, so an
+    edited script only re-synthesizes the segments that changed.
+    """
+
+    SUFFIX = ".pcm"
+    KIND = "TTS cache"
+
+    @staticmethod
+    def key(text: str, voice_name: str) -> str:
+        return hashlib.sha256(f"{voice_name}|{OUTPUT_FORMAT}|{text}".encode("utf-8")).hexdigest()
+
+
+def build_ssml(script: str, voice_name: str) -> str:
+    return (
+        "<speak version='1.0' xml:lang='en-US'>"
+        f"<voice name={quoteattr(voice_name)}>{escape(script)}</voice>"
+        "</speak>"
+    )
+
+
+class AzureTTSClient:
+    """
+    Azure speech synthesis over a pooled async HTTP client. Access tokens are
+    reused until shortly before they expire instead of being fetched per call.
+    """
+
+    def __init__(self, key: str, token_endpoint: str, speech_endpoint: str, token_ttl: float = 540.0, timeout: float = 60.0):
+        self.key = key
+        self.token_endpoint = token_endpoint
+        self.speech_endpoint = speech_endpoint
+        # Azure tokens are valid for 10 minutes.
+        self.token_ttl = token_ttl
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+        self._token: Optional[str] = None
+        self._token_expires_at = 0.0
+        self._token_lock = asyncio.Lock()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _get_token(self, refresh: bool = False) -> str:
+        async with self._token_lock:
+            if refresh or self._token is None or time.monotonic() >= self._token_expires_at:
+                response = await self.client.post(self.token_endpoint, headers={'Ocp-Apim-Subscription-Key': self.key})
+                if response.status_code != 200:
+                    raise TTSError(response.status_code, f"Token request failed: {response.text}")
+                self._token = response.text
+                self._token_expires_at = time.monotonic() + self.token_ttl
+            return self._token
+
+    async def open_stream(self, script: str, voice_name: str) -> httpx.Response:
+        """
+        Starts synthesis and returns the streaming response once the service
+        has accepted it. The caller must close it with `aclose()`.
+        """
+        with metrics.stage("tts_connect", items=1):
+            return await self._open_stream(script, voice_name)
+
+    async def _open_stream(self, script: str, voice_name: str) -> httpx.Response:
+        body = build_ssml(script, voice_name).encode('utf-8')
+        for attempt in range(2):
+            token = await self._get_token(refresh=attempt > 0)
+            request = self.client.build_request(
+                "POST",
+                self.speech_endpoint,
+                headers={
+                    'Authorization': 'Bearer ' + token,
+                    'Content-Type': 'application/ssml+xml',
+                    'X-Microsoft-OutputFormat': OUTPUT_FORMAT,
+                    'User-Agent': 'FastAPIApp'
+                },
+                content=body,
+            )
+            response = await self.client.send(request, stream=True)
+            if response.status_code == 200:
+                return response
+            detail = (await response.aread()).decode('utf-8', errors='replace')
+            await response.aclose()
+            # A token revoked before its expiry is refreshed once.
+            if response.status_code != 401:
+                break
+        raise TTSError(response.status_code, f"Speech request failed: {detail}")
+
+    async def stream_pcm(self, response: httpx.Response) -> AsyncIterator[bytes]:
+        try:
+            async for chunk in response.aiter_bytes():
+                yield chunk
+        finally:
+            await response.aclose()
+
+    async def synthesize(self, script: str, voice_name: str) -> bytes:
+        """Returns the complete raw PCM for `script`."""
+        with metrics.stage("tts_call", items=1):
+            response = await self.open_stream(script, voice_name)
+            try:
+                return await response.aread()
+            finally:
+                await response.aclose()
+
+    async def _synthesize_segment(self, text: str, voice_name: str, semaphore: asyncio.Semaphore,
+                                  retries: int, cache: Optional[SegmentCache]) -> bytes:
+        key = SegmentCache.key(text, voice_name)
+        if cache is not None:
+            cached = await asyncio.to_thread(cache.get, key)
+            if cached is not None:
+                return cached
+        async with semaphore:
+            for attempt in range(retries + 1):
+                try:
+                    pcm = await self.synthesize(text, voice_name)
+                    break
+                except (TTSError, httpx.HTTPError) as e:
+                    if attempt == retries or not _is_retryable(e):
+                        raise
+                    print(f"TTS segment failed ({e}), retrying ({attempt + 1}/{retries})")
+                    await asyncio.sleep(0.5 * 2 ** attempt)
+        if cache is not None:
+            await asyncio.to_thread(cache.put, key, pcm)
+        return pcm
+
+    async def synthesize_segments(self, segments: List[str], voice_name: str, concurrency: int = 4,
+                                  retries: int = 2, cache: Optional[SegmentCache] = None) -> AsyncIterator[bytes]:
+        """
+        Synthesizes up to `concurrency` segments at a time and yields each
+        segment's PCM in script order as soon as it and its predecessors are
+        done. Transient failures are retried `retries` times per segment.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        tasks = [
+            asyncio.create_task(self._synthesize_segment(text, voice_name, semaphore, retries, cache))
+            for text in segments
+        ]
+        try:
+            for task in tasks:
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
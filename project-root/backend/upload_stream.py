@@ -0,0 +1,228 @@
+import os
+import queue
+import asyncio
+import hashlib
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from starlette.requests import Request
+try:
+    from python_multipart.exceptions import ParseError
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ModuleNotFoundError:
+    # Releases of python-multipart before 0.0.13 install as 'multipart'.
+    from multipart.exceptions import ParseError
+    from multipart.multipart import MultipartParser, parse_options_header
+
+
+class UploadError(Exception):
+    """Raised when a streamed upload is malformed or exceeds a size limit."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class PdfQueue:
+    """
+    Hands uploaded PDFs from the request to the ingestion job as each one is
+    complete. Iterating yields (path, sha256) pairs until the upload is
+    closed, and raises the upload's error if it failed.
+    """
+
+    _CLOSED = object()
+
+    def __init__(self):
+        self._queue: queue.Queue = queue.Queue()
+        self._error: Optional[Exception] = None
+
+    def put(self, path: Path, sha256: str):
+        self._queue.put((path, sha256))
+
+    def close(self, error: Optional[Exception] = None):
+        self._error = error
+        self._queue.put(self._CLOSED)
+
+    def __iter__(self) -> Iterator[Tuple[Path, str]]:
+        while True:
+            item = self._queue.get()
+            if item is self._CLOSED:
+                if self._error is not None:
+                    raise RuntimeError(f"Upload failed: {self._error}")
+                return
+            yield item
+
+
+class _FilePart:
+    def __init__(self, field_name: str, path: Path):
+        self.field_name = field_name
+        self.path = path
+        self.tmp_path = path.with_name(path.name + ".part")
+        self.file = None
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.pending: List[bytes] = []
+        self.finished = False
+
+
+class _StreamingForm:
+    """
+    Multipart callbacks that buffer one network chunk's worth of file data,
+    which `flush` then writes and hashes off the event loop.
+    """
+
+    def __init__(self, destination: Callable[[str, str], Path], max_file_bytes: int, max_total_bytes: int):
+        self.destination = destination
+        self.max_file_bytes = max_file_bytes
+        self.max_total_bytes = max_total_bytes
+        self.total_bytes = 0
+        self.fields: Dict[str, str] = {}
+        self.parts: List[_FilePart] = []
+        self._headers: Dict[bytes, bytes] = {}
+        self._header_name = b""
+        self._header_value = b""
+        self._field_name = ""
+        self._field_data = bytearray()
+        self._current: Optional[_FilePart] = None
+
+    def on_part_begin(self):
+        self._headers = {}
+        self._field_data = bytearray()
+        self._current = None
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._header_name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        self._headers[self._header_name.lower()] = self._header_value
+        self._header_name = b""
+        self._header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        if b"name" not in options:
+            raise UploadError(400, 'The Content-Disposition header field "name" must be provided.')
+        self._field_name = options[b"name"].decode("utf-8", errors="replace")
+        if b"filename" in options:
+            filename = options[b"filename"].decode("utf-8", errors="replace")
+            self._current = _FilePart(self._field_name, self.destination(self._field_name, filename))
+            self.parts.append(self._current)
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        size = end - start
+        self.total_bytes += size
+        if self.total_bytes > self.max_total_bytes:
+            raise UploadError(413, f"Upload exceeds the limit of {self.max_total_bytes // (1024 * 1024)} MB.")
+        if self._current is None:
+            if len(self._field_data) + size > 64 * 1024:
+                raise UploadError(413, f"Form field '{self._field_name}' is too large.")
+            self._field_data += data[start:end]
+            return
+        self._current.size += size
+        if self._current.size > self.max_file_bytes:
+            raise UploadError(
+                413, f"File '{self._current.path.name}' exceeds the limit of {self.max_file_bytes // (1024 * 1024)} MB."
+            )
+        self._current.pending.append(data[start:end])
+
+    def on_part_end(self):
+        if self._current is None:
+            self.fields[self._field_name] = self._field_data.decode("utf-8", errors="replace")
+        else:
+            self._current.finished = True
+
+    def callbacks(self) -> Dict[str, Callable]:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+        }
+
+    def dirty(self) -> bool:
+        return any(part.pending or part.finished for part in self.parts)
+
+    def flush(self) -> List[Tuple[_FilePart, str]]:
+        """
+        Writes and hashes buffered data and moves finished files into place.
+        Returns (part, sha256) for each file completed since the last flush.
+        """
+        completed = []
+        for part in self.parts:
+            if part.pending:
+                if part.file is None:
+                    part.path.parent.mkdir(parents=True, exist_ok=True)
+                    part.file = open(part.tmp_path, "wb")
+                for data in part.pending:
+                    part.digest.update(data)
+                    part.file.write(data)
+                part.pending.clear()
+            if part.finished:
+                if part.file is None:
+                    part.tmp_path.write_bytes(b"")
+                else:
+                    part.file.close()
+                os.replace(part.tmp_path, part.path)
+                completed.append((part, part.digest.hexdigest()))
+        self.parts = [part for part in self.parts if not part.finished]
+        return completed
+
+    def discard(self):
+        """Removes partially written files after a failed upload."""
+        for part in self.parts:
+            if part.file is not None:
+                part.file.close()
+            part.tmp_path.unlink(missing_ok=True)
+        self.parts = []
+
+
+async def receive_files(
+    request: Request,
+    destination: Callable[[str, str], Path],
+    on_file: Callable[[str, Path, str], None],
+    max_file_bytes: int,
+    max_total_bytes: int,
+) -> Dict[str, str]:
+    """
+    Streams a multipart request body straight to disk. Each file part is
+    written to `destination(field_name, filename)` (via a '.part' file that is
+    renamed once complete) and hashed while it is written, so nothing is
+    buffered in memory or copied twice. `on_file(field_name, path, sha256)` is
+    called as soon as each file is complete, while later parts are still
+    arriving. Returns the request's plain form fields.
+
+    Raises UploadError (413) as soon as a file exceeds `max_file_bytes` or
+    the body exceeds `max_total_bytes`. On any error the file being written
+    is removed; files already passed to `on_file` are left for the caller to
+    clean up.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise UploadError(400, "Expected a multipart/form-data request.")
+
+    form = _StreamingForm(destination, max_file_bytes, max_total_bytes)
+    parser = MultipartParser(params[b"boundary"], form.callbacks())
+    try:
+        async for chunk in request.stream():
+            try:
+                parser.write(chunk)
+            except ParseError as e:
+                raise UploadError(400, f"Malformed multipart body: {e}")
+            if form.dirty():
+                for part, sha256 in await asyncio.to_thread(form.flush):
+                    on_file(part.field_name, part.path, sha256)
+        parser.finalize()
+        for part, sha256 in await asyncio.to_thread(form.flush):
+            on_file(part.field_name, part.path, sha256)
+        if form.parts:
+            raise UploadError(400, "Upload ended in the middle of a file.")
+    except Exception:
+        await asyncio.to_thread(form.discard)
+        raise
+    return form.fields
@@ -108,14 +108,13 @@ function Upload() {
       formData.append('bulk_files', file);
     }
     formData.append('fresh_file', freshFile);
-    formData.append('task_name', tempTaskName);
 
     try {
       setIsUploading(true);
       setUploadStatus('Uploading...');
       setShowTaskNameModal(false);
 
-      const response = await fetch(`${API_URL}/upload_task`, {
+      const response = await fetch(`${API_URL}/upload_task/${encodeURIComponent(tempTaskName)}`, {
         method: 'POST',
         body: formData,
       });
@@ -307,7 +306,7 @@ function Upload() {
                   <div className="card-top">
                     <h3 className="task-card-title">{task.task_name.replace('_', ' ')}</h3>
                     <span className={`status-badge ${task.status}`}>
-                      {task.status === 'processing' ? <FaSpinner className="spinner-small" /> : 'Ready'}
+                      {task.status === 'processing' ? <FaSpinner className="spinner-small" /> : task.status === 'failed' ? 'Failed' : 'Ready'}
                     </span>
                   </div>
                   <div className="card-meta">